@@ -15,80 +15,189 @@ import logging
 '''######################################################'''
 ''''complete code is written int the lines below'''
 
+import hashlib
+import json
 import logging
 import os
+import sys
+import time
+import numpy as np
 import pandas as pd
 import requests
+import key_index
+import metrics
+import online_store
+import schema
+import source_fetcher
+import storage
 from datetime import datetime as dt
 from datetime import timezone, timedelta
 
 logging.basicConfig(filename= 'D:\\MSBA\\Courses\\Fall_2024\\BZAN545\\Assignments\\Group_ASS\\final_project\\data_sets\\feature_store_log.log', level=logging.INFO)
 
+DATA_URL = source_fetcher.DEFAULT_SOURCE_URL
+
+# What the last processed payload of every source looked like; kept inside the store so it goes away with it
+UPSTREAM_STATE_PATH = os.path.join(storage.STORE_DIR, "_upstream_state.json")
+# Top-level keys of the state file from before it was kept per source URL (then only DATA_URL was fetched)
+LEGACY_STATE_KEYS = ('etag', 'last_modified', 'content_hash', 'slice_hashes', 'fetched_at')
+
+# Turn the fetched script into a DataFrame with the canonical column types
+def parse_data(content):
+    # Execute the fetched content in a safe way
+    local_vars = {}
+    exec(content, {}, local_vars)
+    data = local_vars.get('data')
+    if data is None:
+        raise ValueError("The variable 'data' was not defined in the script.")
+    return schema.to_canonical(pd.DataFrame(data), table='upstream payload')  # Convert data to DataFrame
+
 # Function to fetch data from URL
 def fetch_data():
     try:
-        url = 'http://ballings.co/data.py'
-        response = requests.get(url)
+        response = requests.get(DATA_URL, timeout=source_fetcher.FETCH_TIMEOUT)
         if response.status_code == 200:
-            # Execute the fetched content in a safe way
-            local_vars = {}
-            exec(response.content, {}, local_vars)
-            data = local_vars.get('data')
-            if data is None:
-                raise ValueError("The variable 'data' was not defined in the script.")
-            return pd.DataFrame(data)  # Convert data to DataFrame
+            return parse_data(response.content)
         else:
             raise ValueError(f"Failed to fetch data, HTTP status code: {response.status_code}")
     except Exception as e:
         logging.error(f"Failed to fetch data: {e}")
         raise
 
+def read_upstream_state():
+    """ETag, Last-Modified, content hash and per-salesdate slice hashes of the last processed payload, by source URL."""
+    if not os.path.exists(os.path.join(storage.STORE_DIR, storage.MANIFEST_NAME)):
+        return {}  # no store yet: everything has to be processed
+    try:
+        with open(UPSTREAM_STATE_PATH) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if any(key in state for key in LEGACY_STATE_KEYS):
+        state = migrate_upstream_state(state)
+        write_upstream_state(state)
+    return state
+
+def migrate_upstream_state(state):
+    """Move the flat keys of a state file written for the single default source into that source's entry."""
+    legacy = {key: state.pop(key) for key in LEGACY_STATE_KEYS if key in state}
+    state.setdefault(DATA_URL, legacy)  # an entry written since is newer
+    logging.info(f"Migrated the upstream state of {DATA_URL} to per-source entries")
+    return state
+
+def write_upstream_state(state):
+    tmp_path = UPSTREAM_STATE_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_path, UPSTREAM_STATE_PATH)
+
+def slice_hashes(data, dates):
+    """Order-independent content hash of every salesdate slice of the fetched data, by ISO date."""
+    row_hashes = pd.util.hash_pandas_object(data, index=False).to_numpy()
+    hashes = {}
+    for salesdate, positions in data.groupby(dates.to_numpy(), sort=False, dropna=False).indices.items():
+        hashes[str(salesdate)] = hashlib.sha1(np.sort(row_hashes[positions]).tobytes()).hexdigest()
+    return hashes
+
 # Function to save new rows to local disk
 def save_data_daily(new_rows):
-    directory = r"D:\\MSBA\\Courses\\Fall_2024\\BZAN545\\Assignments\\Group_ASS\\final_project\\data_sets"
-    os.makedirs(directory, exist_ok=True)  # Create directory if it doesn't exist
-
-    file_path = os.path.join(directory, "feature_store.csv")
-
-    # Load existing data if file exists
-    if os.path.exists(file_path):
-        existing_data = pd.read_csv(file_path)
-    else:
-        existing_data = pd.DataFrame()
-
-    # Find new rows that are not in the existing data based on specific key columns
-    if not existing_data.empty:
-        # Assuming 'salesdate', 'productid', and 'region' uniquely identify a record
-        existing_keys = existing_data[['salesdate', 'productid', 'region']]
-        new_keys = new_rows[['salesdate', 'productid', 'region']]
-        
-        # Identify new rows by checking for their keys
-        new_rows = new_rows[~new_keys.apply(tuple, axis=1).isin(existing_keys.apply(tuple, axis=1))]
-
-    # Add update_time to new rows if any
+    # Create the partitioned store on first use, migrating the old feature_store.csv
+    storage.ensure_store()
+
+    # Keep only rows whose ('salesdate', 'productid', 'region') key is not stored yet.
+    # The on-disk key index is rebuilt from the store if it is missing or stale.
+    with metrics.timed('dedup') as timer:
+        timer.rows = len(new_rows)
+        new_rows = key_index.filter_new_rows(new_rows)
+
+    # Add update_time to new rows if any and append them as new salesdate partitions
     if not new_rows.empty:
         eastern_time = timezone(timedelta(hours=-5)) 
-        new_rows['update_time'] = dt.now(eastern_time).strftime("%Y-%m-%d %I:%M %p")  # Format the update time
+        # Eastern wall-clock time to the minute, like the update times already stored
+        new_rows['update_time'] = pd.Timestamp(dt.now(eastern_time).replace(tzinfo=None)).floor('min')
 
-        # Append new rows to existing data
-        updated_data = pd.concat([existing_data, new_rows], ignore_index=True)
-    else:
-        updated_data = existing_data
+        with metrics.timed('write') as timer:
+            timer.rows = len(new_rows)
+            storage.append_rows(new_rows)
+            key_index.update_index(new_rows)
+            online_store.update(new_rows)   # latest feature vectors for /features
 
-    # Save the updated data
-    updated_data.to_csv(file_path, index=False)
-    logging.info(f"Data saved to {file_path}")
+    logging.info(f"Data saved to {storage.STORE_DIR} ({len(new_rows)} new rows)")
 
-# Main update function to fetch and save data
-def daily_update():
+# Main update function to fetch and save data; returns True unless the update failed
+def daily_update(sources=None):
     try:
-        new_data = fetch_data()          # Fetch the new data
-        save_data_daily(new_data)        # Save it to disk only new rows
-        logging.info(f"Feature store updated successfully at {dt.now()}")
+        timings = {}
+        with metrics.timed('fetch') as timer:
+            state = read_upstream_state()
+            sources = sources or source_fetcher.load_sources()
+            results = source_fetcher.fetch_sources(sources, state)   # Conditional, concurrent fetch
+            timer.bytes = sum(len(result.get('content', b"")) for result in results)
+        timings['fetch'] = timer.seconds
+
+        batches = []
+        timings['parse'] = timings['diff'] = 0.0
+        for result in results:
+            name = result['source']['name']
+            metrics.inc('fetch_sources_total', source=name, status=result['status'])
+            if result['status'] == 'failed':
+                logging.error(f"Source {name} failed after {result['attempts']} attempts: {result['error']}")
+                continue
+            if result['status'] == 'unchanged':
+                logging.info(f"Source {name} unchanged ({result['reason']}); skipping parse, dedup and write "
+                             f"({result['seconds']:.2f}s)")
+                continue
+
+            with metrics.timed('parse', source=name) as timer:
+                new_data = parse_data(result['content'])
+                timer.rows, timer.bytes = len(new_data), len(result['content'])
+            timings['parse'] += timer.seconds
+
+            # Only salesdate slices that are new or differ from the last processed payload go further
+            with metrics.timed('diff', source=name) as timer:
+                dates = storage.partition_dates(new_data['salesdate'])
+                hashes = slice_hashes(new_data, dates)
+                previous = state.get(result['source']['url'], {}).get('slice_hashes', {})
+                changed = [d for d, h in hashes.items() if previous.get(d) != h]
+                batches.append(new_data[dates.isin(changed).to_numpy()])
+                timer.rows = len(new_data)
+            timings['diff'] += timer.seconds
+            logging.info(f"Source {name} changed: processing {len(changed)} of {len(hashes)} salesdate slices "
+                         f"({len(batches[-1])} rows, fetched in {result['seconds']:.2f}s, {result['attempts']} attempts)")
+            result['slice_hashes'] = hashes
+
+        if all(result['status'] == 'failed' for result in results):
+            raise ValueError("Every source failed")
+        if not batches:
+            logging.info(f"Feature store unchanged at {dt.now()} (fetch {timings['fetch']:.2f}s)")
+            return True
+
+        # One merged batch for all changed sources
+        with metrics.timed('save') as timer:
+            new_data = pd.concat(batches, ignore_index=True)
+            if not new_data.empty:
+                save_data_daily(new_data)        # Save it to disk only new rows
+            timer.rows = len(new_data)
+        timings['save'] = timer.seconds
+
+        for result in results:
+            if result['status'] == 'changed':
+                state[result['source']['url']] = {
+                    'etag': result['etag'],
+                    'last_modified': result['last_modified'],
+                    'content_hash': result['content_hash'],
+                    'slice_hashes': result['slice_hashes'],
+                    'fetched_at': dt.now().isoformat(),
+                }
+        write_upstream_state(state)
+        logging.info(f"Feature store updated successfully at {dt.now()} ("
+                     + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()) + ")")
+        return True
     except Exception as e:
         logging.error(f"Failed to update feature store: {e}")
+        return False
 
 # Run the updater once for testing purposes
 if __name__ == "__main__":
     logging.info("Starting the daily feature store updater...")
-    daily_update()  # Run update once for testing
+    sys.exit(0 if daily_update() else 1)  # Run update once; a failed fetch exits 1 for run_all
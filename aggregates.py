@@ -0,0 +1,167 @@
+import threading
+
+import pandas as pd
+
+import metrics
+from regression import RegressionAccumulator
+from rollups import histogram_box_stats, histogram_quantiles
+
+# Every aggregate the dashboards can ask for, by name. Each function receives the
+# Aggregates being computed and may read other aggregates from it, so the finest
+# grouping is done once and coarser aggregates are rolled up from it.
+AGGREGATES = {}
+
+
+def aggregate(name):
+    def register(func):
+        AGGREGATES[name] = func
+        return func
+    return register
+
+
+class Aggregates:
+    """Lazily computed, memoized dashboard aggregates over one set of rollups.
+
+    rollups is a dict with the 'daily', 'weekday' and 'histogram' frames, as
+    returned by rollups.load_rollups() or columnar_index.rollups_for(). An
+    aggregate is computed the first time it is read and then shared by every
+    plot, metric card and dashboard reading the same instance.
+
+    previous is the Aggregates of the data version being replaced, if any;
+    aggregates that can be updated from their previous value (see previous_value)
+    do so instead of starting over.
+    """
+
+    def __init__(self, rollups, previous=None):
+        self.rollups = rollups
+        self.previous = previous
+        self._values = {}
+        self._lock = threading.RLock()
+
+    def __getitem__(self, name):
+        if name not in self._values:
+            with self._lock:
+                if name not in self._values:
+                    with metrics.timed('aggregate', aggregate=name):
+                        self._values[name] = AGGREGATES[name](self)
+        return self._values[name]
+
+    # Picklable (for the dashboard snapshot file) without the lock or the previous version
+    def __getstate__(self):
+        return {'rollups': self.rollups, 'values': dict(self._values)}
+
+    def __setstate__(self, state):
+        self.rollups = state['rollups']
+        self.previous = None
+        self._values = state['values']
+        self._lock = threading.RLock()
+
+    def previous_value(self, name):
+        """The aggregate as computed for the previous data version, or None if it was not."""
+        return None if self.previous is None else self.previous._values.get(name)
+
+    def compute(self, names):
+        """Compute the given aggregates now (e.g. before swapping in a refreshed snapshot).
+
+        Drops the reference to the previous version afterwards, so old versions are not kept alive.
+        """
+        for name in names:
+            self[name]
+        self.previous = None
+        return self
+
+
+# Weekday rollup: grouped once by (region, weekday), coarser levels roll up from there
+
+@aggregate('region_weekday')
+def _region_weekday(aggs):
+    return aggs.rollups['weekday'].groupby(['region', 'weekday_name'], observed=True)[
+        ['row_count', 'items_sold', 'discount_sum']
+    ].sum()
+
+
+@aggregate('by_weekday')
+def _by_weekday(aggs):
+    return aggs['region_weekday'].groupby(level='weekday_name', observed=True).sum()
+
+
+@aggregate('weekday_sales')
+def _weekday_sales(aggs):
+    return aggs['by_weekday']['items_sold'].rename('itemssold').reset_index()
+
+
+@aggregate('avg_discount_weekday')
+def _avg_discount_weekday(aggs):
+    by_weekday = aggs['by_weekday']
+    return (by_weekday['discount_sum'] / by_weekday['row_count']).rename('discount').reset_index()
+
+
+@aggregate('region_sales')
+def _region_sales(aggs):
+    return aggs['region_weekday'].groupby(level='region')['items_sold'].sum().rename('itemssold').reset_index()
+
+
+@aggregate('mean_items_sold_region_weekday')
+def _mean_items_sold_region_weekday(aggs):
+    region_weekday = aggs['region_weekday']
+    return (region_weekday['items_sold'] / region_weekday['row_count']).rename('itemssold').reset_index()
+
+
+# Daily rollup
+
+@aggregate('daily_sales')
+def _daily_sales(aggs):
+    by_day = aggs.rollups['daily'].groupby('salesdate')[['row_count', 'items_sold', 'discount_sum']].sum()
+    return pd.DataFrame({
+        'total_items_sold': by_day['items_sold'],
+        'avg_discount': by_day['discount_sum'] / by_day['row_count'],
+    }).reset_index()
+
+
+@aggregate('daily_regression')
+def _daily_regression(aggs):
+    daily_sales = aggs['daily_sales']
+    regression, previous_sales = aggs.previous_value('daily_regression'), aggs.previous_value('daily_sales')
+    if regression is None or previous_sales is None:
+        return RegressionAccumulator.from_arrays(daily_sales['avg_discount'], daily_sales['total_items_sold'])
+
+    # Update the previous fit: take out the days that changed or disappeared, add the new values
+    columns = ['avg_discount', 'total_items_sold']
+    old = previous_sales.set_index('salesdate')[columns]
+    new = daily_sales.set_index('salesdate')[columns]
+    both = old.join(new, how='outer', lsuffix='_old', rsuffix='_new')
+    changed = both[~(both[[f'{c}_old' for c in columns]].to_numpy() ==
+                     both[[f'{c}_new' for c in columns]].to_numpy()).all(axis=1)]
+    regression = regression.copy()  # the previous version may still be serving requests
+    regression.remove(changed['avg_discount_old'], changed['total_items_sold_old'])
+    regression.add(changed['avg_discount_new'], changed['total_items_sold_new'])
+    return regression
+
+
+# Items histogram
+
+@aggregate('median_items_sold_region_freeship')
+def _median_items_sold_region_freeship(aggs):
+    return histogram_quantiles(aggs.rollups['histogram'], ['region', 'freeship'], 0.5).reset_index()
+
+
+@aggregate('weekday_histogram')
+def _weekday_histogram(aggs):
+    return aggs.rollups['histogram'].groupby(['weekday_name', 'itemssold'], observed=True)['row_count'].sum().reset_index()
+
+
+@aggregate('weekday_box')
+def _weekday_box(aggs):
+    # Box plot and median/IQR cards share one summary per weekday
+    return histogram_box_stats(aggs['weekday_histogram'], 'weekday_name')
+
+
+@aggregate('weekday_medians')
+def _weekday_medians(aggs):
+    return aggs['weekday_box']['median'].astype(float).rename('itemssold')
+
+
+@aggregate('weekday_iqr')
+def _weekday_iqr(aggs):
+    weekday_box = aggs['weekday_box']
+    return (weekday_box['q3'] - weekday_box['q1']).astype(float).rename('itemssold')
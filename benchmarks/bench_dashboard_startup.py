@@ -0,0 +1,83 @@
+"""Measure dashboard startup: module import, app creation and time to first render.
+
+Each measurement runs in a fresh interpreter so import costs are real. The
+"database" mode loads the aggregates from PostgreSQL (DB_* credentials from
+.env); the "snapshot" mode starts from a DASHBOARD_SNAPSHOT_PATH file written
+by a previous run, as a restarted process would.
+
+    python benchmarks/bench_dashboard_startup.py --runs 3 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Runs inside the child interpreter and prints its timings as JSON
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module} as dashboard
+imported = time.perf_counter()
+plotly_at_import = 'plotly.express' in sys.modules
+app = dashboard.create_app()
+created = time.perf_counter()
+figure = dashboard.update_sales_plot('items_sold_distribution')
+if hasattr(dashboard, 'update_dynamic_metrics'):
+    dashboard.update_dynamic_metrics('items_sold_distribution')
+rendered = time.perf_counter()
+print(json.dumps({{
+    'import_s': imported - start,
+    'create_app_s': created - imported,
+    'first_render_s': rendered - created,
+    'total_s': rendered - start,
+    'plotly_loaded_at_import': plotly_at_import,
+}}))
+"""
+
+
+def measure(module, env):
+    code = PROBE.format(module=module)
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(runs):
+    return {key: statistics.median(run[key] for run in runs)
+            for key in ('import_s', 'create_app_s', 'first_render_s', 'total_s')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--module", default="dashboard", choices=["dashboard", "new_dash"])
+    parser.add_argument("--output", help="append the results to this JSON lines file")
+    args = parser.parse_args()
+
+    results = {}
+    env = dict(os.environ, DASHBOARD_REFRESH_SECONDS="3600")
+    env.pop("DASHBOARD_SNAPSHOT_PATH", None)
+    results["database"] = summarize([measure(args.module, env) for _ in range(args.runs)])
+
+    if args.module == "dashboard":
+        with tempfile.TemporaryDirectory() as tmp:
+            env["DASHBOARD_SNAPSHOT_PATH"] = os.path.join(tmp, "dashboard_snapshot.pkl")
+            measure(args.module, env)  # writes the snapshot file
+            results["snapshot"] = summarize([measure(args.module, env) for _ in range(args.runs)])
+
+    print(f"\n{'mode':<10} {'import':>8} {'app':>8} {'render':>8} {'total':>8}  (seconds, median of {args.runs})")
+    for mode, r in results.items():
+        print(f"{mode:<10} {r['import_s']:>8.3f} {r['create_app_s']:>8.3f} {r['first_render_s']:>8.3f} {r['total_s']:>8.3f}")
+
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps({'module': args.module, 'runs': args.runs, 'results': results}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
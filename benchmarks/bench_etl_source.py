@@ -0,0 +1,139 @@
+"""Compare end-to-end feature_store load time through the Flask API and straight from the store files.
+
+Builds a scratch feature store of --rows rows (CSV plus the partitioned Parquet
+store) in a temporary directory, then times a full reload of feature_store from
+each route:
+
+    api-json   GET /data as JSON, then load_data_to_db (the original route)
+    api-arrow  GET /data as an Arrow stream, then sync_data_to_db(source='api')
+    store      sync_data_to_db(source='store'), reading the Parquet partitions in chunks
+    csv        sync_data_to_db(source='csv'), reading feature_store.csv in chunks
+
+then, with --append-rows, appends that many restated rows to the store and times
+the incremental sync that follows, which reads only the newly appended part files.
+
+The API routes include the time the API spends reading and indexing the store on
+the first request. Uses the DB_* credentials from .env like insert_to_sql; every
+route drops and reloads feature_store, so point it at a scratch database.
+
+    python benchmarks/bench_etl_source.py --rows 200000 --append-rows 2000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+API_PORT = 5000  # pro_flask_api.py always serves here
+API_URL = f"http://127.0.0.1:{API_PORT}/data"
+ROUTES = ['api-json', 'api-arrow', 'store', 'csv']
+
+
+def build_store(rows, data_dir):
+    """Write the sample data scaled to rows as feature_store.csv and migrate it to the Parquet store."""
+    from bench_load_to_db import sample_frame
+    import storage
+    df = sample_frame(rows)
+    csv_path = os.path.join(data_dir, "feature_store.csv")
+    df.to_csv(csv_path, index=False)
+    storage.migrate_csv(csv_path, os.path.join(data_dir, "feature_store"))
+    return len(df)
+
+
+def start_api(data_dir):
+    env = dict(os.environ, FEATURE_STORE_DIR=data_dir)
+    process = subprocess.Popen([sys.executable, "pro_flask_api.py"], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"http://127.0.0.1:{API_PORT}/health", timeout=1).status_code == 200:
+                return process
+        except requests.RequestException:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("the API did not start")
+
+
+def load(route, chunk_size):
+    import insert_to_sql
+    if route == 'api-json':
+        insert_to_sql.load_data_to_db(insert_to_sql.fetch_data_from_api(API_URL), chunk_size=chunk_size)
+        return True
+    source = 'api' if route == 'api-arrow' else route
+    return insert_to_sql.sync_data_to_db(API_URL, chunk_size=chunk_size, source=source, full=True)
+
+
+def append_and_sync(rows, chunk_size):
+    """Append rows restating existing keys to the store, then time the incremental sync that picks them up."""
+    import insert_to_sql
+    import schema
+    import storage
+    batch = storage.read_store().head(rows)
+    batch = batch.assign(itemssold=batch['itemssold'] + 1, update_time=pd.Timestamp.now().floor('min'))
+    storage.append_rows(schema.to_canonical(batch))
+    start = time.perf_counter()
+    insert_to_sql.sync_data_to_db(chunk_size=chunk_size, source='store')
+    return len(batch), time.perf_counter() - start
+
+
+def count_rows():
+    import insert_to_sql
+    conn = insert_to_sql.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM feature_store")
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--routes", nargs="+", default=ROUTES, choices=ROUTES)
+    parser.add_argument("--append-rows", type=int, default=0, help="rows appended before timing an incremental sync")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        # storage reads FEATURE_STORE_DIR at import time
+        os.environ['FEATURE_STORE_DIR'] = data_dir
+        expected = build_store(args.rows, data_dir)
+
+        results = []
+        for route in args.routes:
+            # A fresh API process per route, so no route reuses another's parsed store
+            api = start_api(data_dir) if route.startswith('api') else None
+            try:
+                start = time.perf_counter()
+                load(route, args.chunk_size)
+                elapsed = time.perf_counter() - start
+            finally:
+                if api is not None:
+                    api.terminate()
+                    api.wait()
+            loaded = count_rows()
+            if loaded != expected:
+                print(f"warning: {route} loaded {loaded} of {expected} rows")
+            results.append((route, loaded, elapsed))
+        if args.append_rows:
+            appended, incremental = append_and_sync(args.append_rows, args.chunk_size)
+
+    baseline = results[0][2]
+    print(f"\n{'route':<10} {'rows':>10} {'seconds':>9} {'rows/s':>12} {'speedup':>8}")
+    for route, loaded, elapsed in results:
+        print(f"{route:<10} {loaded:>10} {elapsed:>9.2f} {loaded / elapsed:>12,.0f} {baseline / elapsed:>7.1f}x")
+    if args.append_rows:
+        print(f"\nincremental sync of {appended} appended rows: {incremental:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
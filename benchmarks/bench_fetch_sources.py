@@ -0,0 +1,202 @@
+"""Exercise source_fetcher against a local stub upstream: 304s, content hashes, retries, timeouts and concurrency.
+
+Starts a stub HTTP server in this process that serves synthetic data.py payloads
+(the format Fetch_data.parse_data executes) under one path prefix per behaviour:
+
+    /ok/N.py        200 with an ETag and Last-Modified; 304 when the validators match
+    /nocache/N.py   200 without validators, so only the content hash can skip it
+    /flaky/N.py     503 for the first --flaky-failures requests, then like /ok
+    /down/N.py      always 500
+    /slow/N.py      like /ok after sleeping --slow-seconds
+
+then fetches them with source_fetcher.fetch_sources and checks every outcome:
+
+    fresh        /ok sources, no state                  changed, 1 attempt
+    conditional  /ok again with the state from fresh    unchanged (HTTP 304)
+    content      /nocache twice                         unchanged (content hash) the second time
+    flaky        /flaky                                 changed after flaky-failures + 1 attempts
+    down         /down                                  failed after retries + 1 attempts
+    timeout      /slow with a timeout below the delay   failed after retries + 1 attempts
+    concurrent   --sources /slow sources, long timeout  all changed in about sources / concurrency delays
+
+Prints one line per scenario and exits with status 1 if an outcome differs.
+With --serve the stub just keeps running, for manual runs of Fetch_data:
+
+    python benchmarks/bench_fetch_sources.py
+    python benchmarks/bench_fetch_sources.py --serve --port 8766
+    FEATURE_SOURCES=http://127.0.0.1:8766/ok/0.py,http://127.0.0.1:8766/flaky/1.py python Fetch_data.py
+"""
+import argparse
+import hashlib
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import source_fetcher  # noqa: E402
+
+REGIONS = ['a', 'b', 'c', 'd', 'e']
+
+
+def payload(rows, seed):
+    """A data.py script defining data = {...} with rows rows of upstream-formatted features."""
+    rng = random.Random(seed)
+    columns = {
+        'salesdate': [f"9/{1 + i % 28}/2024" for i in range(rows)],
+        'productid': [i // len(REGIONS) for i in range(rows)],
+        'region': [REGIONS[i % len(REGIONS)] for i in range(rows)],
+        'freeship': [rng.randint(0, 1) for _ in range(rows)],
+        'discount': [round(rng.uniform(0, 10), 3) for _ in range(rows)],
+        'itemssold': [rng.randint(0, 300) for _ in range(rows)],
+    }
+    return f"data = {columns!r}\n".encode()
+
+
+class StubUpstream(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port, rows, flaky_failures, slow_seconds):
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.rows = rows
+        self.flaky_failures = flaky_failures
+        self.slow_seconds = slow_seconds
+        self.requests = Counter()  # by path
+        self.lock = threading.Lock()
+        self.last_modified = formatdate(time.time(), usegmt=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass  # keep the report readable
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests[self.path] += 1
+            count = server.requests[self.path]
+        behaviour, _, name = self.path.strip("/").partition("/")
+        seed = int(name.split(".")[0]) if name.split(".")[0].isdigit() else 0
+        body = payload(server.rows, seed)
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+
+        if behaviour == 'down' or (behaviour == 'flaky' and count <= server.flaky_failures):
+            self.send_response(500 if behaviour == 'down' else 503)
+            self.end_headers()
+            return
+        if behaviour == 'slow':
+            time.sleep(server.slow_seconds)
+        if behaviour not in ('ok', 'nocache', 'flaky', 'slow'):
+            self.send_response(404)
+            self.end_headers()
+            return
+        if behaviour != 'nocache' and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/x-python")
+        self.send_header("Content-Length", str(len(body)))
+        if behaviour != 'nocache':
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", server.last_modified)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client timed out first (the timeout scenario)
+
+
+def sources(stub, behaviour, count, timeout):
+    return [{'name': f"{behaviour}/{i}", 'url': f"{stub.url}/{behaviour}/{i}.py", 'timeout': timeout}
+            for i in range(count)]
+
+
+def state_after(results):
+    """The per-URL state Fetch_data keeps after processing results."""
+    return {result['source']['url']: {key: result[key] for key in ('etag', 'last_modified', 'content_hash')}
+            for result in results if result['status'] == 'changed'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=0, help="stub port (0 picks a free one)")
+    parser.add_argument("--rows", type=int, default=10000, help="rows per payload")
+    parser.add_argument("--sources", type=int, default=8, help="sources in the concurrent scenario")
+    parser.add_argument("--concurrency", type=int, default=source_fetcher.FETCH_CONCURRENCY)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=0.05, help="base backoff delay in seconds")
+    parser.add_argument("--flaky-failures", type=int, default=2)
+    parser.add_argument("--slow-seconds", type=float, default=0.5)
+    parser.add_argument("--serve", action="store_true", help="only run the stub server")
+    args = parser.parse_args()
+
+    stub = StubUpstream(args.port, args.rows, args.flaky_failures, args.slow_seconds)
+    if args.serve:
+        print(f"Stub upstream serving {args.rows}-row payloads at {stub.url}/{{ok,nocache,flaky,down,slow}}/N.py")
+        stub.serve_forever()
+        return
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+
+    def fetch(source_list, state=None, concurrency=args.concurrency):
+        start = time.perf_counter()
+        results = source_fetcher.fetch_sources(source_list, state or {}, concurrency=concurrency,
+                                               retries=args.retries, backoff=args.backoff)
+        return results, time.perf_counter() - start
+
+    timeout = 10.0
+    checks = []
+
+    def check(scenario, results, seconds, status, attempts, reason=None, max_seconds=None):
+        ok = all(r['status'] == status and r['attempts'] == attempts
+                 and (reason is None or r.get('reason') == reason) for r in results)
+        if max_seconds is not None:
+            ok = ok and seconds <= max_seconds
+        outcome = Counter(r['status'] for r in results)
+        detail = ", ".join(f"{n} {s}" for s, n in outcome.items())
+        reasons = sorted({r['reason'] for r in results if r.get('reason')} | {r['error'] for r in results if r.get('error')})
+        expected = f"{status}, {attempts} attempt(s)" + (f", {reason}" if reason else "")
+        print(f"{scenario:<12} {seconds:>7.2f}s  {detail:<18} attempts {sorted({r['attempts'] for r in results})}"
+              f"  {'; '.join(reasons)}" + ("" if ok else f"  MISMATCH (expected {expected})"))
+        checks.append(ok)
+
+    fresh, seconds = fetch(sources(stub, 'ok', 2, timeout))
+    check('fresh', fresh, seconds, 'changed', 1)
+    results, seconds = fetch(sources(stub, 'ok', 2, timeout), state_after(fresh))
+    check('conditional', results, seconds, 'unchanged', 1, reason="HTTP 304")
+
+    first, _ = fetch(sources(stub, 'nocache', 2, timeout))
+    results, seconds = fetch(sources(stub, 'nocache', 2, timeout), state_after(first))
+    check('content', results, seconds, 'unchanged', 1, reason="content hash unchanged")
+
+    results, seconds = fetch(sources(stub, 'flaky', 2, timeout))
+    check('flaky', results, seconds, 'changed', args.flaky_failures + 1)
+    results, seconds = fetch(sources(stub, 'down', 1, timeout))
+    check('down', results, seconds, 'failed', args.retries + 1)
+    results, seconds = fetch(sources(stub, 'slow', 1, args.slow_seconds / 2))
+    check('timeout', results, seconds, 'failed', args.retries + 1)
+
+    # Every source waits slow_seconds, so concurrent fetching takes about ceil(sources / concurrency) of those
+    waves = -(-args.sources // args.concurrency)
+    results, seconds = fetch(sources(stub, 'slow', args.sources, timeout))
+    check('concurrent', results, seconds, 'changed', 1, max_seconds=(waves + 1) * args.slow_seconds)
+    print(f"{'':<12} {args.sources} sources x {args.slow_seconds:g}s at concurrency {args.concurrency}: "
+          f"{args.sources * args.slow_seconds:.2f}s sequentially")
+
+    stub.shutdown()
+    if not all(checks):
+        print(f"\n{checks.count(False)} scenario(s) did not behave as expected")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Compare rows/second of the load_data_to_db methods against PostgreSQL.
+
+Uses the DB_* credentials from .env like insert_to_sql. Every run drops and
+recreates the feature_store table, so point it at a scratch database.
+
+    python benchmarks/bench_load_to_db.py --rows 50000 --methods rows values copy
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import insert_to_sql  # noqa: E402
+
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "feature_store.csv")
+
+
+def sample_frame(rows):
+    """The sample feature_store.csv repeated until it has the requested number of rows.
+
+    Each copy gets its own productid range so every (salesdate, productid, region) key is unique.
+    """
+    sample = pd.read_csv(SAMPLE_CSV).drop_duplicates(subset=insert_to_sql.KEY_COLUMNS, keep='last')
+    repeats = -(-rows // len(sample))
+    copies = [sample.assign(productid=sample['productid'] + 1000 * i) for i in range(repeats)]
+    return pd.concat(copies, ignore_index=True).head(rows)
+
+
+def count_rows():
+    conn = insert_to_sql.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM feature_store")
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=insert_to_sql.LOAD_CHUNK_ROWS)
+    parser.add_argument("--methods", nargs="+", default=["rows", "values", "copy"])
+    args = parser.parse_args()
+
+    df = sample_frame(args.rows)
+    records = df.to_dict(orient="records")  # what the JSON API path hands to the loader
+
+    results = []
+    for method in args.methods:
+        data = records if method == 'rows' else df
+        start = time.perf_counter()
+        insert_to_sql.load_data_to_db(data, method=method, chunk_size=args.chunk_size)
+        elapsed = time.perf_counter() - start
+        loaded = count_rows()
+        results.append((method, loaded, elapsed, loaded / elapsed))
+        if loaded != len(df):
+            print(f"warning: {method} loaded {loaded} of {len(df)} rows")
+
+    baseline = results[0][3]
+    print(f"\n{'method':<8} {'rows':>10} {'seconds':>9} {'rows/s':>12} {'speedup':>8}")
+    for method, loaded, elapsed, rate in results:
+        print(f"{method:<8} {loaded:>10} {elapsed:>9.2f} {rate:>12,.0f} {rate / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
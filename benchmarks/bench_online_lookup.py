@@ -0,0 +1,127 @@
+"""Measure online feature lookup latency (online_store.py) against p50/p99 targets.
+
+Generates (or reuses) a synthetic store of --rows rows like bench_suite.py, brings
+its online store up to date (timing the rebuild when one is needed), then times
+lookups of random (productid, region) entities:
+
+    get.latest        one entity's latest feature vector
+    get.as_of         one entity's vector as of a random salesdate
+    get_many.latest   --batch-size entities per call
+    http.get          GET /features through the Flask app (test client, no network)
+    http.batch        POST /features with --batch-size entities
+
+Prints p50, p99 and max per benchmark and exits with status 1 if a target is
+missed. Batch targets are for 100 entities and scale with --batch-size.
+
+    python benchmarks/bench_online_lookup.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from bench_suite import DATA_ROOT, parse_size  # noqa: E402
+import synthetic_store  # noqa: E402
+
+# (p50, p99) latency targets in seconds, measured in this process
+TARGETS = {
+    'get.latest': (50e-6, 250e-6),
+    'get.as_of': (50e-6, 250e-6),
+    'get_many.latest': (2.5e-3, 10e-3),
+    'http.get': (1e-3, 5e-3),
+    'http.batch': (5e-3, 20e-3),
+}
+TARGET_BATCH_SIZE = 100
+BATCH_BENCHMARKS = ('get_many.latest', 'http.batch')
+
+
+def timings(func, calls):
+    """Seconds taken by each of calls calls of func(i)."""
+    seconds = np.empty(calls)
+    for i in range(calls):
+        start = time.perf_counter()
+        func(i)
+        seconds[i] = time.perf_counter() - start
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="1M", help="store size, e.g. 10k 1M 10M")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--lookups", type=int, default=20000, help="timed calls per single-entity benchmark")
+    parser.add_argument("--batches", type=int, default=500, help="timed calls per batch benchmark")
+    parser.add_argument("--batch-size", type=int, default=TARGET_BATCH_SIZE)
+    parser.add_argument("--data-root", default=DATA_ROOT, help="where synthetic stores are generated and kept")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the online store even if it is current")
+    args = parser.parse_args()
+
+    rows = parse_size(args.rows)
+    data_dir = os.path.join(args.data_root, f"{rows}-seed{args.seed}")
+    os.makedirs(data_dir, exist_ok=True)
+    # storage (and so the API) reads FEATURE_STORE_DIR at import time
+    os.environ['FEATURE_STORE_DIR'] = data_dir
+    store_dir = synthetic_store.write_store(rows, data_dir, args.seed)
+    import online_store
+    import pro_flask_api
+
+    start = time.perf_counter()
+    if args.rebuild:
+        online_store.rebuild(store_dir)
+    if args.rebuild or online_store.ensure_current(store_dir):
+        print(f"online store rebuilt from {rows} rows in {time.perf_counter() - start:.1f}s")
+
+    days, _, products = synthetic_store.layout(rows)
+    rng = random.Random(args.seed)
+    regions = synthetic_store.REGIONS.tolist()
+    n = max(args.lookups, args.batches * args.batch_size)
+    entities = [(rng.randrange(products), rng.choice(regions)) for _ in range(n)]
+    dates = [(synthetic_store.FIRST_DATE + pd.Timedelta(days=rng.randrange(days))).strftime("%Y-%m-%d")
+             for _ in range(n)]
+    batches = [entities[i * args.batch_size:(i + 1) * args.batch_size] for i in range(args.batches)]
+
+    store = online_store.OnlineStore(store_dir)
+    client = pro_flask_api.app.test_client()
+    pro_flask_api.load_online_store()
+    benchmarks = {
+        'get.latest': (lambda i: store.get(*entities[i]), args.lookups),
+        'get.as_of': (lambda i: store.get(*entities[i], as_of=dates[i]), args.lookups),
+        'get_many.latest': (lambda i: store.get_many(batches[i]), args.batches),
+        'http.get': (lambda i: client.get(f"/features?productid={entities[i][0]}&region={entities[i][1]}"),
+                     args.lookups // 10),
+        'http.batch': (lambda i: client.post("/features", json={
+            'entities': [{'productid': p, 'region': r} for p, r in batches[i]]}), args.batches),
+    }
+
+    timings(lambda i: store.get(*entities[i]), min(1000, n))  # warm the page cache
+    sample = entities[:1000]
+    hits = sum(store.get(*entity) is not None for entity in sample)
+    print(f"{rows} rows, {hits / len(sample):.0%} of random entities found, batches of {args.batch_size}\n")
+    print(f"{'benchmark':<18} {'calls':>7} {'p50 us':>9} {'p99 us':>9} {'max us':>9} {'target p50/p99 us':>19}")
+    missed = 0
+    for name, (func, calls) in benchmarks.items():
+        seconds = timings(func, calls)
+        p50, p99 = np.percentile(seconds, [50, 99])
+        target_p50, target_p99 = TARGETS[name]
+        if name in BATCH_BENCHMARKS:
+            scale = args.batch_size / TARGET_BATCH_SIZE
+            target_p50, target_p99 = target_p50 * scale, target_p99 * scale
+        ok = p50 <= target_p50 and p99 <= target_p99
+        missed += not ok
+        print(f"{name:<18} {calls:>7} {p50 * 1e6:>9.1f} {p99 * 1e6:>9.1f} {seconds.max() * 1e6:>9.1f} "
+              f"{f'{target_p50 * 1e6:.0f}/{target_p99 * 1e6:.0f}':>19}" + ("" if ok else "  MISSED"))
+
+    if missed:
+        print(f"\n{missed} latency target(s) missed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
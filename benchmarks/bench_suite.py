@@ -0,0 +1,378 @@
+"""Benchmark the pipeline end to end on synthetic feature stores of several sizes.
+
+For every size a synthetic store is generated once (see synthetic_store.py) and
+reused by later runs. Each group of benchmarks then runs in a fresh interpreter,
+so peak RSS is measured per group:
+
+    save       save_data_daily dedup of an update batch, key index rebuild
+    api        /data serving: cold and warm full pulls, filtered, paged and incremental queries
+    db         read_store, load_data_to_db and sync_data_to_db against PostgreSQL
+    dashboard  rollup and row loads, every registered aggregate, every plot's
+               figure and metric callbacks (unfiltered and filtered)
+
+The db and dashboard groups use the DB_* credentials from .env and drop and
+reload feature_store, so point them at a scratch database; without a reachable
+database they are reported as skipped. Results are compared against
+benchmarks/baseline.json, and a step slower (or using more memory) than its
+baseline by more than --tolerance is reported as a regression and makes the run
+exit with status 1. Baselines are machine specific: regenerate them with
+--save-baseline on the machine the comparisons run on.
+
+    python benchmarks/bench_suite.py --sizes 10k 1M 10M
+    python benchmarks/bench_suite.py --sizes 10k --groups save api --save-baseline
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+
+BASELINE_PATH = os.path.join(HERE, "baseline.json")
+GROUPS = ['save', 'api', 'db', 'dashboard']
+SIZES = ['10k', '1M', '10M']
+DATA_ROOT = os.path.join(tempfile.gettempdir(), "feature_store_bench")
+
+
+def parse_size(size):
+    """'10k' -> 10000, '1M' -> 1000000, '2500' -> 2500."""
+    multipliers = {'k': 1_000, 'm': 1_000_000}
+    size = size.strip().lower()
+    if size[-1] in multipliers:
+        return int(float(size[:-1]) * multipliers[size[-1]])
+    return int(size)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MiB (None if it cannot be measured)."""
+    if sys.platform.startswith('linux'):
+        # VmHWM starts over at exec, unlike ru_maxrss, which a worker inherits from the process that forked it
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 ** 2  # bytes on macOS
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1024 ** 2  # Windows
+        except (ImportError, AttributeError):
+            return None
+
+
+# Benchmark groups; each runs in its own worker process with FEATURE_STORE_DIR set
+
+class Steps:
+    """Collects timed steps of one worker."""
+
+    def __init__(self):
+        self.results = []
+
+    def time(self, name, func, rows=None):
+        """Run func, record its duration, and return its result; rows may be a callable of the result."""
+        start = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - start
+        self.results.append({
+            'name': name,
+            'seconds': seconds,
+            'rows': rows(result) if callable(rows) else rows,
+            'peak_rss_mb': peak_rss_mb(),  # the process peak so far, i.e. up to and including this step
+        })
+        return result
+
+    def skip(self, name, reason):
+        self.results.append({'name': name, 'skipped': reason})
+
+
+def pd_days(days):
+    import pandas as pd
+    return pd.Timedelta(days=days)
+
+
+def run_save(steps, rows, seed):
+    import pandas as pd
+    import Fetch_data
+    import key_index
+    import storage
+    from synthetic_store import day_rows, layout
+
+    days, per_day, products = layout(rows)
+    duplicates = day_rows(0, per_day, products, seed)  # the first day is always complete in the store
+    new_day = day_rows(days, per_day, products, seed)
+    batch = pd.concat([duplicates, new_day], ignore_index=True)
+
+    steps.time('save_data_daily.half_new', lambda: Fetch_data.save_data_daily(batch.copy()), rows=len(batch))
+    steps.time('save_data_daily.all_duplicates', lambda: Fetch_data.save_data_daily(duplicates.copy()),
+               rows=len(duplicates))
+    steps.time('key_index.rebuild', lambda: key_index.rebuild_index(storage.STORE_DIR), rows=rows + len(new_day))
+
+
+def run_api(steps, rows, seed):
+    import pyarrow as pa
+    import pro_flask_api
+    from synthetic_store import FIRST_DATE, layout
+
+    client = pro_flask_api.app.test_client()
+    days = layout(rows)[0]
+    week_end = (FIRST_DATE + pd_days(6)).strftime("%Y-%m-%d")
+    last_update = (FIRST_DATE + pd_days(days)).strftime("%Y-%m-%d")
+
+    def arrow_rows(url):
+        return lambda: pa.ipc.open_stream(client.get(url).get_data()).read_all().num_rows
+
+    def json_rows(url):
+        return lambda: len(client.get(url).get_json())
+
+    steps.time('api.arrow_cold', arrow_rows("/data?format=arrow"), rows=lambda n: n)
+    steps.time('api.arrow_warm', arrow_rows("/data?format=arrow"), rows=lambda n: n)
+    steps.time('api.json_filtered', json_rows(f"/data?start={FIRST_DATE:%Y-%m-%d}&end={week_end}&region=a"),
+               rows=lambda n: n)
+    steps.time('api.json_page', json_rows("/data?limit=10000"), rows=lambda n: n)
+    steps.time('api.arrow_incremental', arrow_rows(f"/data?format=arrow&updated_after={last_update}"),
+               rows=lambda n: n)
+
+
+def database_error():
+    """Why PostgreSQL cannot be used, or None if it can."""
+    import db
+    try:
+        with db.get_engine().connect():
+            return None
+    except Exception as e:
+        return f"database unavailable ({type(e).__name__})"
+
+
+def table_rows():
+    import insert_to_sql
+    conn = insert_to_sql.get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('feature_store') IS NOT NULL")
+            if not cur.fetchone()[0]:
+                return 0
+            cur.execute("SELECT count(*) FROM feature_store")
+            return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def run_db(steps, rows, seed):
+    error = database_error()
+    if error:
+        steps.skip('db', error)
+        return
+    import insert_to_sql
+    import storage
+
+    df = steps.time('read_store', storage.read_store, rows=rows)
+    steps.time('load_data_to_db.copy', lambda: insert_to_sql.load_data_to_db(df, method='copy'), rows=rows)
+    if table_rows() != rows:
+        raise RuntimeError("load_data_to_db did not load every row")
+    del df
+    steps.time('sync_data_to_db.store_full',
+               lambda: insert_to_sql.sync_data_to_db(source='store', full=True), rows=rows)
+    steps.time('sync_data_to_db.store_incremental',
+               lambda: insert_to_sql.sync_data_to_db(source='store'), rows=rows)
+
+
+def run_dashboard(steps, rows, seed):
+    error = database_error()
+    if error:
+        steps.skip('dashboard', error)
+        return
+    if table_rows() != rows:
+        steps.skip('dashboard', "feature_store does not hold this size; run the db group first")
+        return
+    import columnar_index
+    import dashboard_data
+    import rollups
+    from aggregates import AGGREGATES, Aggregates
+    from plots import PLOTS
+    from synthetic_store import FIRST_DATE
+
+    loaded = steps.time('rollups.load_rollups', rollups.load_rollups)
+    frame = steps.time('columnar_index.load_rows', columnar_index.load_rows, rows=rows)
+    steps.time('columnar_index.build_index', lambda: columnar_index.build_index(frame), rows=rows)
+    del frame
+
+    # In registry order, so each step pays only for its own aggregate
+    aggs = Aggregates(loaded)
+    for name in AGGREGATES:
+        steps.time(f'aggregate.{name}', lambda: aggs[name])
+
+    import plots
+    steps.time('import.plotly', plots._plotly)  # paid once by the first render of a process
+    steps.time('dashboard_data.load_data', lambda: dashboard_data.refresher.refresh(force=True), rows=rows)
+    # A refresh after a sync with no new rows: merges the rows at the high-water mark into the previous index
+    previous = dashboard_data.refresher.snapshot()
+    steps.time('dashboard_data.load_data.incremental', lambda: dashboard_data.load_data(previous), rows=rows)
+    filters = dashboard_data.normalize_filters(
+        f"{FIRST_DATE:%Y-%m-%d}", f"{FIRST_DATE + pd_days(29):%Y-%m-%d}", ['a'], None, 'all'
+    )
+    index = previous[1]['index']
+    steps.time('columnar_index.filter', lambda: columnar_index.rollups_for(
+        index, columnar_index.filter_mask(index, *filters)), rows=rows)
+    for plot_id in PLOTS:
+        steps.time(f'callback.figure.{plot_id}', lambda: dashboard_data.render('figure', plot_id))
+        steps.time(f'callback.metrics.{plot_id}', lambda: dashboard_data.render('metrics', plot_id))
+        steps.time(f'callback.figure_filtered.{plot_id}', lambda: dashboard_data.render('figure', plot_id, filters))
+    plot_id = next(iter(PLOTS))
+    steps.time('callback.figure_cached', lambda: dashboard_data.render('figure', plot_id))
+    dashboard_data.refresher.stop()
+
+
+WORKERS = {'save': run_save, 'api': run_api, 'db': run_db, 'dashboard': run_dashboard}
+
+
+# Driver
+
+def run_group(group, rows, seed, data_dir):
+    """Run one benchmark group in a fresh interpreter and return its step results."""
+    store_dir = data_dir
+    if group == 'save':
+        # save_data_daily appends to the store, so it works on a throwaway copy
+        store_dir = os.path.join(data_dir, "_save_work")
+        shutil.rmtree(store_dir, ignore_errors=True)
+        shutil.copytree(os.path.join(data_dir, "feature_store"), os.path.join(store_dir, "feature_store"))
+    env = dict(os.environ, FEATURE_STORE_DIR=store_dir)
+    try:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", group, "--rows", str(rows), "--seed", str(seed)],
+            env=env, cwd=store_dir, capture_output=True, text=True,
+        )
+    finally:
+        if group == 'save':
+            shutil.rmtree(store_dir, ignore_errors=True)
+    if completed.returncode != 0:
+        return [{'name': group, 'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else
+                 f"exit code {completed.returncode}"}]
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def fastest(runs):
+    """Merge repeated runs of a group: the fastest time and lowest peak RSS of every step."""
+    merged = {}
+    for results in runs:
+        for result in results:
+            best = merged.setdefault(result['name'], dict(result))
+            if 'seconds' in result:
+                best['seconds'] = min(best['seconds'], result['seconds'])
+                if result['peak_rss_mb'] is not None and best['peak_rss_mb'] is not None:
+                    best['peak_rss_mb'] = min(best['peak_rss_mb'], result['peak_rss_mb'])
+    return list(merged.values())
+
+
+def compare(result, baseline, tolerance, min_seconds):
+    """Regression notes for one step against its baseline entry (empty when within tolerance)."""
+    notes = []
+    if not baseline or 'seconds' not in result:
+        return notes
+    base = baseline.get('seconds')
+    if base and result['seconds'] > base * (1 + tolerance) and result['seconds'] - base > min_seconds:
+        notes.append(f"time +{result['seconds'] / base - 1:.0%}")
+    base_rss = baseline.get('peak_rss_mb')
+    if base_rss and result['peak_rss_mb'] and result['peak_rss_mb'] > base_rss * (1 + tolerance):
+        notes.append(f"rss +{result['peak_rss_mb'] / base_rss - 1:.0%}")
+    return notes
+
+
+def print_results(rows, group, results, baseline, tolerance, min_seconds):
+    regressions = 0
+    for result in results:
+        name = f"{group}/{result['name']}"
+        if 'error' in result:
+            print(f"{rows:>9} {name:<60} FAILED: {result['error']}")
+            regressions += 1
+            continue
+        if 'skipped' in result:
+            print(f"{rows:>9} {name:<60} skipped: {result['skipped']}")
+            continue
+        rate = f"{result['rows'] / result['seconds']:,.0f}" if result['rows'] and result['seconds'] else "-"
+        rss = f"{result['peak_rss_mb']:.0f}" if result['peak_rss_mb'] is not None else "-"
+        base = baseline.get(name)
+        notes = compare(result, base, tolerance, min_seconds)
+        regressions += bool(notes)
+        versus = f"{result['seconds'] / base['seconds']:.2f}x" if base and base.get('seconds') else "new"
+        print(f"{rows:>9} {name:<60} {result['seconds']:>9.3f} {rate:>13} {rss:>8} {versus:>7}"
+              + (f"  REGRESSION ({', '.join(notes)})" if notes else ""))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=SIZES, help="store sizes, e.g. 10k 1M 10M")
+    parser.add_argument("--groups", nargs="+", default=GROUPS, choices=GROUPS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="run every group this many times and keep the best")
+    parser.add_argument("--data-root", default=DATA_ROOT, help="where synthetic stores are generated and kept")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown / memory growth (0.25 = 25%%)")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="ignore slowdowns smaller than this, which are mostly noise")
+    parser.add_argument("--output", help="append the results to this JSON lines file")
+    parser.add_argument("--worker", choices=GROUPS, help=argparse.SUPPRESS)
+    parser.add_argument("--rows", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        steps = Steps()
+        WORKERS[args.worker](steps, args.rows, args.seed)
+        print(json.dumps(steps.results))
+        return
+
+    from synthetic_store import write_store
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+
+    regressions = 0
+    print(f"{'rows':>9} {'benchmark':<60} {'seconds':>9} {'rows/s':>13} {'rss MiB':>8} {'vs base':>7}")
+    for size in args.sizes:
+        rows = parse_size(size)
+        data_dir = os.path.join(args.data_root, f"{rows}-seed{args.seed}")
+        os.makedirs(data_dir, exist_ok=True)
+        start = time.perf_counter()
+        write_store(rows, data_dir, args.seed)
+        print(f"{rows:>9} {'(synthetic store ready)':<60} {time.perf_counter() - start:>9.3f}")
+
+        baseline = baselines.get(str(rows), {})
+        measured = {}
+        for group in args.groups:
+            results = fastest([run_group(group, rows, args.seed, data_dir) for _ in range(args.repeat)])
+            regressions += print_results(rows, group, results, baseline, args.tolerance, args.min_seconds)
+            measured.update({f"{group}/{r['name']}": r for r in results if 'seconds' in r})
+
+        if args.output:
+            with open(args.output, "a") as f:
+                f.write(json.dumps({'rows': rows, 'seed': args.seed, 'time': time.time(), 'results': measured}) + "\n")
+        if args.save_baseline:
+            baselines.setdefault(str(rows), {}).update({
+                name: {'seconds': round(r['seconds'], 6),
+                       'peak_rss_mb': round(r['peak_rss_mb'], 1) if r['peak_rss_mb'] is not None else None}
+                for name, r in measured.items()
+            })
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=1, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline saved to {args.baseline}")
+    elif regressions:
+        print(f"\n{regressions} regression(s) against {args.baseline}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Synthetic feature stores with the schema of feature_store.csv, at any size.
+
+Rows are spread over consecutive salesdates (at most MAX_DAYS of them). Every
+day holds a distinct set of (productid, region) keys, so keys are unique across
+the whole store, like in the real data. The output is deterministic for a
+given seed, and any single day can be regenerated on its own (see day_rows),
+which the benchmarks use to build update batches that match the stored data.
+
+    python benchmarks/synthetic_store.py --rows 1000000 --data-dir /tmp/fs-1m
+"""
+import argparse
+import math
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import key_index  # noqa: E402
+import online_store  # noqa: E402
+import storage  # noqa: E402
+
+REGIONS = np.array(['a', 'b', 'c', 'd', 'e'])
+FIRST_DATE = pd.Timestamp('2024-01-01')
+ROWS_PER_DAY = 140   # about what the sample feature_store.csv has
+MIN_PRODUCTS = 300   # productids 0-299 in the sample
+MAX_DAYS = 365
+WRITE_CHUNK_ROWS = 1_000_000
+
+
+def layout(rows):
+    """(days, rows per day, number of productids) of a store with the given number of rows."""
+    days = min(MAX_DAYS, max(1, math.ceil(rows / ROWS_PER_DAY)))
+    per_day = math.ceil(rows / days)
+    products = max(MIN_PRODUCTS, math.ceil(per_day / len(REGIONS)))
+    return days, per_day, products
+
+
+def _date_strings(dates):
+    # m/d/yyyy without zero padding, like the upstream data (and without the
+    # platform-specific %-m strftime flag)
+    return (dates.month.astype(str) + "/" + dates.day.astype(str) + "/" + dates.year.astype(str)).to_numpy()
+
+
+def day_rows(day, per_day, products, seed=0):
+    """The rows of one salesdate (day 0 is FIRST_DATE)."""
+    rng = np.random.default_rng([seed, day])
+    grid = products * len(REGIONS)
+    keys = (np.arange(per_day) + rng.integers(grid)) % grid  # distinct keys, a different slice every day
+    discount = np.round(rng.uniform(0, 10, per_day), 3)
+    itemssold = np.clip(rng.normal(60 + 10 * discount, 45), 0, None).astype('int64')
+    salesdate = FIRST_DATE + pd.Timedelta(days=day)
+    return pd.DataFrame({
+        'salesdate': _date_strings(pd.DatetimeIndex([salesdate]))[0],
+        'productid': keys // len(REGIONS),
+        'region': REGIONS[keys % len(REGIONS)],
+        'freeship': rng.integers(0, 2, per_day),
+        'discount': discount,
+        'itemssold': itemssold,
+        'update_time': _date_strings(pd.DatetimeIndex([salesdate + pd.Timedelta(days=1)]))[0],
+    })
+
+
+def generate(rows, seed=0):
+    """A synthetic feature store of exactly rows rows, oldest salesdate first."""
+    return pd.concat(iter_chunks(rows, seed), ignore_index=True)
+
+
+def iter_chunks(rows, seed=0, chunk_rows=WRITE_CHUNK_ROWS):
+    """generate(rows, seed) as DataFrames of whole days, about chunk_rows rows each."""
+    days, per_day, products = layout(rows)
+    remaining = rows
+    frames, size = [], 0
+    for day in range(days):
+        frame = day_rows(day, per_day, products, seed).head(remaining)
+        remaining -= len(frame)
+        frames.append(frame)
+        size += len(frame)
+        if size >= chunk_rows or remaining == 0:
+            yield pd.concat(frames, ignore_index=True)
+            frames, size = [], 0
+        if remaining == 0:
+            break
+
+
+def write_store(rows, data_dir, seed=0):
+    """Write a synthetic partitioned store (with its key index and online store) under data_dir/feature_store.
+
+    Returns the store directory. A store already completed there is reused, and its
+    online store is built if it is missing or behind, so saves measure the steady state.
+    """
+    store_dir = os.path.join(data_dir, "feature_store")
+    marker = os.path.join(data_dir, f"_complete-{rows}-{seed}")
+    if os.path.exists(marker):
+        online_store.ensure_current(store_dir)
+        return store_dir
+    if os.path.exists(store_dir):
+        raise RuntimeError(f"{store_dir} exists but was not written for {rows} rows and seed {seed}")
+    os.makedirs(store_dir)
+    for chunk in iter_chunks(rows, seed):
+        storage.append_rows(chunk, store_dir)
+    key_index.rebuild_index(store_dir)
+    online_store.rebuild(store_dir)
+    open(marker, "w").close()
+    return store_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--data-dir", required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--csv", action="store_true", help="also write a legacy feature_store.csv")
+    args = parser.parse_args()
+
+    store_dir = write_store(args.rows, args.data_dir, args.seed)
+    if args.csv:
+        csv_path = os.path.join(args.data_dir, "feature_store.csv")
+        for i, chunk in enumerate(iter_chunks(args.rows, args.seed)):
+            chunk.to_csv(csv_path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    print(f"{args.rows} rows written to {store_dir}")
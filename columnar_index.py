@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+
+import db
+import schema
+from rollups import WEEKDAYS_ORDER
+
+# Rows the dashboards can filter on, with NULLs replaced the same way the rollups replace them
+COLUMNS_SQL = """
+SELECT salesdate, productid, COALESCE(region, '') AS region, COALESCE(freeship, false) AS freeship,
+       COALESCE(discount, 0) AS discount, COALESCE(itemssold, 0) AS itemssold
+FROM feature_store WHERE salesdate IS NOT NULL
+"""
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def load_rows(updated_after=None):
+    """The rows to index; with updated_after, only the rows updated at or after it."""
+    if updated_after is None:
+        return schema.to_canonical(db.read_large_sql(COLUMNS_SQL), table='dashboard rows')
+    query = COLUMNS_SQL + " AND update_time >= :updated_after"
+    return schema.to_canonical(db.read_large_sql(query, {'updated_after': updated_after}))
+
+
+def build_index(df):
+    """Encode the feature_store rows as compact numpy columns for filtering and re-aggregation.
+
+    Dates become day ordinals (days since 1970-01-01), regions categorical codes,
+    products int32 and weekdays 0 (Monday) to 6 (Sunday); the other columns keep
+    their canonical schema types.
+    """
+    df = schema.to_canonical(df)
+    days = (df['salesdate'].to_numpy(dtype='datetime64[D]') - EPOCH).astype(np.int32)
+    region_codes, regions = pd.factorize(df['region'].astype(str), sort=True)
+    return {
+        'days': days,
+        'weekdays': ((days + 3) % 7).astype(np.int8),  # 1970-01-01 was a Thursday
+        'regions': np.asarray(regions, dtype=object),
+        'region_codes': region_codes.astype(np.int16),
+        'productids': df['productid'].to_numpy(dtype=np.int32),
+        'freeship': df['freeship'].to_numpy(dtype=bool),
+        'discount': df['discount'].to_numpy(dtype=np.float32),
+        'itemssold': df['itemssold'].to_numpy(dtype=np.int32),
+    }
+
+
+def _keys(days, productids, region_codes, n_regions):
+    # One int64 per (salesdate, productid, region) primary key
+    productids = productids.astype(np.int64) & 0xFFFFFFFF
+    return (days.astype(np.int64) * 2 ** 32 + productids) * n_regions + region_codes
+
+
+def merge_index(index, df):
+    """index with the rows of df added, replacing the indexed rows with the same primary key.
+
+    Costs one pass over the in-memory columns instead of a read of the whole table.
+    """
+    if df.empty:
+        return index
+    update = build_index(df)
+    regions = np.union1d(index['regions'], update['regions']).astype(object)
+    old_codes = np.searchsorted(regions, index['regions']).astype(np.int16)[index['region_codes']]
+    new_codes = np.searchsorted(regions, update['regions']).astype(np.int16)[update['region_codes']]
+    keep = ~np.isin(_keys(index['days'], index['productids'], old_codes, len(regions)),
+                    _keys(update['days'], update['productids'], new_codes, len(regions)))
+    merged = {name: np.concatenate([index[name][keep], update[name]])
+              for name in ('days', 'weekdays', 'productids', 'freeship', 'discount', 'itemssold')}
+    merged['regions'] = regions
+    merged['region_codes'] = np.concatenate([old_codes[keep], new_codes])
+    return merged
+
+
+def matches_rollups(index, daily):
+    """True if the index adds up to the daily rollup (rows, items sold and discount per day, region and freeship).
+
+    Catches changes an incremental merge cannot see, such as rows restated with
+    an older update_time or a full reload by the loader.
+    """
+    if len(index['days']) == 0:
+        return int(daily['row_count'].sum()) == 0
+    key = ['salesdate', 'region', 'freeship']
+    ours = rollups_for(index, np.ones(len(index['days']), dtype=bool))['daily']
+    ours, theirs = (frame.astype({'salesdate': 'datetime64[ns]'}).set_index(key).sort_index() for frame in (ours, daily))
+    return (
+        ours.index.equals(theirs.index)
+        and np.array_equal(ours['row_count'].to_numpy(), theirs['row_count'].to_numpy())
+        and np.array_equal(ours['items_sold'].to_numpy(), theirs['items_sold'].to_numpy())
+        and np.allclose(ours['discount_sum'].to_numpy(), theirs['discount_sum'].to_numpy(dtype=float))
+    )
+
+
+def to_day(value):
+    """Day ordinal of a date string or timestamp."""
+    return int((np.datetime64(pd.Timestamp(value).date(), 'D') - EPOCH).astype(int))
+
+
+def filter_options(index):
+    """Values offered by the dashboard filters."""
+    if len(index['days']) == 0:
+        return {'regions': [], 'productids': [], 'start': None, 'end': None}
+    return {
+        'regions': list(index['regions']),
+        'productids': np.unique(index['productids']).tolist(),
+        'start': str(EPOCH + int(index['days'].min())),
+        'end': str(EPOCH + int(index['days'].max())),
+    }
+
+
+def filter_mask(index, start=None, end=None, regions=None, productids=None, freeship=None):
+    """Boolean mask of the rows matching every given filter (None or empty means no filter)."""
+    mask = np.ones(len(index['days']), dtype=bool)
+    if start is not None:
+        mask &= index['days'] >= to_day(start)
+    if end is not None:
+        mask &= index['days'] <= to_day(end)
+    if regions:
+        # Compare small integer codes instead of strings
+        wanted = np.isin(index['regions'], list(regions))
+        mask &= wanted[index['region_codes']]
+    if productids:
+        mask &= np.isin(index['productids'], np.asarray(list(productids), dtype=np.int32))
+    if freeship is not None:
+        mask &= index['freeship'] == bool(freeship)
+    return mask
+
+
+def rollups_for(index, mask):
+    """The daily, weekday and histogram rollups of the masked rows, shaped like rollups.load_rollups()."""
+    regions = index['regions']
+    n_regions = max(len(regions), 1)
+    # Work on the selected rows only; every group code below is a small non-negative integer
+    days = index['days'][mask].astype(np.int64)
+    itemssold = index['itemssold'][mask]
+    discount = schema.discount_as_float64(index['discount'][mask])  # sums match the float8 rollups
+    region_freeship = index['region_codes'][mask].astype(np.int64) * 2 + index['freeship'][mask]
+    cells = index['weekdays'][mask].astype(np.int64) * (n_regions * 2) + region_freeship
+
+    # Daily: one group per (day, region, freeship)
+    first_day = int(days.min())
+    codes = (days - first_day) * (n_regions * 2) + region_freeship
+    counts = np.bincount(codes)
+    groups = np.flatnonzero(counts)
+    daily = pd.DataFrame({
+        'salesdate': pd.to_datetime(EPOCH + first_day + groups // (n_regions * 2)),
+        'region': regions[groups // 2 % n_regions],
+        'freeship': (groups % 2).astype(bool),
+        'row_count': counts[groups],
+        'items_sold': np.bincount(codes, weights=itemssold)[groups].astype(np.int64),
+        'discount_sum': np.bincount(codes, weights=discount)[groups],
+    })
+
+    # Weekday: one group per (weekday, region, freeship)
+    counts = np.bincount(cells, minlength=7 * n_regions * 2)
+    groups = np.flatnonzero(counts)
+    weekday = pd.DataFrame({
+        'weekday': (groups // (n_regions * 2) + 1).astype(np.int16),
+        'region': regions[groups // 2 % n_regions],
+        'freeship': (groups % 2).astype(bool),
+        'row_count': counts[groups],
+        'items_sold': np.bincount(cells, weights=itemssold)[groups].astype(np.int64),
+        'discount_sum': np.bincount(cells, weights=discount)[groups],
+    })
+
+    # Histogram: one group per (weekday, region, freeship, itemssold)
+    items_min = int(itemssold.min())
+    n_items = int(itemssold.max()) - items_min + 1
+    counts = np.bincount(cells * n_items + (itemssold - items_min))
+    groups = np.flatnonzero(counts)
+    histogram = pd.DataFrame({
+        'weekday': (groups // n_items // (n_regions * 2) + 1).astype(np.int16),
+        'region': regions[groups // n_items // 2 % n_regions],
+        'freeship': (groups // n_items % 2).astype(bool),
+        'itemssold': groups % n_items + items_min,
+        'row_count': counts[groups],
+    })
+
+    for frame in (weekday, histogram):
+        frame['weekday_name'] = pd.Categorical(
+            np.asarray(WEEKDAYS_ORDER, dtype=object)[frame['weekday'] - 1],
+            categories=WEEKDAYS_ORDER,
+            ordered=True
+        )
+    return {'daily': daily, 'weekday': weekday, 'histogram': histogram}
@@ -0,0 +1,235 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from datetime import datetime as dt
+from datetime import timedelta
+
+import schedule
+from werkzeug.serving import make_server
+
+import Fetch_data
+import dashboard_data
+import db
+import insert_to_sql
+import metrics
+import pro_flask_api
+import storage
+
+# Resident alternative to run_all.py: one process keeps the imports, the parsed
+# store behind the API, the database pool and the dashboard aggregates warm, and
+# runs the pipeline jobs on their own schedules instead of starting fresh interpreters.
+
+API_HOST = os.getenv('DAEMON_API_HOST', '127.0.0.1')
+API_PORT = int(os.getenv('DAEMON_API_PORT', 5000))
+API_URL = f"http://{API_HOST}:{API_PORT}/data"
+
+# Job schedules in minutes; DAEMON_FETCH_AT ("HH:MM") runs the fetch once a day at that time instead
+FETCH_EVERY_MINUTES = float(os.getenv('DAEMON_FETCH_EVERY_MINUTES', 24 * 60))
+FETCH_AT = os.getenv('DAEMON_FETCH_AT')
+SYNC_EVERY_MINUTES = float(os.getenv('DAEMON_SYNC_EVERY_MINUTES', 60))
+REFRESH_EVERY_MINUTES = float(os.getenv('DAEMON_REFRESH_EVERY_MINUTES', 5))
+
+# Seconds to wait for running jobs when shutting down
+SHUTDOWN_TIMEOUT = float(os.getenv('DAEMON_SHUTDOWN_TIMEOUT_SECONDS', 300))
+
+# Last run of every job, used to catch up on runs missed while the daemon was down
+STATE_PATH = os.path.join(storage.DATA_DIR, "_daemon_state.json")
+
+
+def sync_to_db():
+    return insert_to_sql.sync_data_to_db(API_URL)
+
+
+def refresh_caches():
+    """Re-index the API store, catch up the online store and recompute the dashboard aggregates
+    if their inputs changed."""
+    pro_flask_api.load_store()
+    pro_flask_api.load_online_store()
+    dashboard_data.refresher.refresh()
+    return True
+
+
+# Jobs in the order they feed each other; catch-up runs them in this order
+JOBS = {
+    'fetch': {'run': Fetch_data.daily_update, 'every': FETCH_EVERY_MINUTES, 'at': FETCH_AT},
+    'sync': {'run': sync_to_db, 'every': SYNC_EVERY_MINUTES, 'at': None},
+    'refresh': {'run': refresh_caches, 'every': REFRESH_EVERY_MINUTES, 'at': None},
+}
+
+
+def read_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_state(state, path=STATE_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def last_due(job, now):
+    """The most recent time a daily job should have started, as a timestamp (None for interval jobs)."""
+    if not job['at']:
+        return None
+    hour, minute = (int(part) for part in job['at'].split(':'))
+    due = dt.fromtimestamp(now).replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if due.timestamp() > now:
+        due -= timedelta(days=1)
+    return due.timestamp()
+
+
+class PipelineDaemon:
+    """Runs the pipeline jobs on their schedules in one long-lived process.
+
+    A job still running when it comes due again is skipped rather than started
+    twice; jobs that missed their schedule while the daemon was down run once
+    at startup; stop() lets running jobs finish before returning.
+    """
+
+    def __init__(self, jobs=JOBS, state_path=STATE_PATH, serve_api=True):
+        self.jobs = jobs
+        self.state_path = state_path
+        self.serve_api = serve_api
+        self.scheduler = schedule.Scheduler()
+        self.state = read_state(state_path)
+        self._locks = {name: threading.Lock() for name in jobs}
+        self._state_lock = threading.Lock()
+        self._threads = set()
+        self._stop = threading.Event()
+        self._server = None
+
+    def run_job(self, name):
+        """Run a job in the calling thread; returns False without running it if it is already running."""
+        if not self._locks[name].acquire(blocking=False):
+            logging.warning(f"Daemon: {name} is still running, skipping this run")
+            return False
+        try:
+            started = time.time()
+            logging.info(f"Daemon: {name} started")
+            with metrics.timed('daemon_job', job=name) as timer:
+                try:
+                    ok = self.jobs[name]['run']() is not False
+                    error = None if ok else "job reported a failure"
+                except Exception as e:
+                    ok, error = False, f"{type(e).__name__}: {e}"
+                timer.status = 'ok' if ok else 'error'
+            seconds = time.time() - started
+            with self._state_lock:
+                entry = self.state.setdefault(name, {})
+                entry.update(last_start=started, last_seconds=seconds, last_status='ok' if ok else 'failed', last_error=error)
+                if ok:
+                    entry['last_success'] = started
+                write_state(self.state, self.state_path)
+            log = logging.info if ok else logging.error
+            log(f"Daemon: {name} {'finished' if ok else 'failed'} in {seconds:.2f}s" + (f" ({error})" if error else ""))
+            return True
+        finally:
+            self._locks[name].release()
+
+    def launch(self, name):
+        """Start a job in a worker thread so a slow job never delays the others."""
+        if self._stop.is_set():
+            return
+        thread = threading.Thread(target=self._run_and_forget, args=(name,), name=f"daemon-{name}", daemon=True)
+        self._threads.add(thread)
+        thread.start()
+
+    def _run_and_forget(self, name):
+        try:
+            self.run_job(name)
+        finally:
+            self._threads.discard(threading.current_thread())
+
+    def overdue(self, now=None):
+        """Jobs whose last successful run is older than their schedule, in job order."""
+        now = time.time() if now is None else now
+        names = []
+        for name, job in self.jobs.items():
+            last = self.state.get(name, {}).get('last_success')
+            due = last_due(job, now)
+            if last is None or (due is not None and last < due) or (due is None and now - last >= job['every'] * 60):
+                names.append(name)
+        return names
+
+    def catch_up(self):
+        names = self.overdue()
+        if names:
+            logging.info(f"Daemon: catching up on {', '.join(names)}")
+        for name in names:
+            if self._stop.is_set():
+                break
+            self.run_job(name)
+
+    def schedule_jobs(self):
+        for name, job in self.jobs.items():
+            if job['at']:
+                self.scheduler.every().day.at(job['at']).do(self.launch, name)
+            else:
+                self.scheduler.every(int(job['every'] * 60)).seconds.do(self.launch, name)
+
+    def start_api(self):
+        # The API runs in this process so its parsed store stays warm between syncs
+        self._server = make_server(API_HOST, API_PORT, pro_flask_api.app, threaded=True)
+        threading.Thread(target=self._server.serve_forever, name="daemon-api", daemon=True).start()
+        logging.info(f"Daemon: API serving on http://{API_HOST}:{API_PORT}")
+
+    def stop(self, *_):
+        self._stop.set()
+
+    def run(self):
+        """Serve the API, catch up on missed runs, then run jobs on schedule until stop() or a signal."""
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+        if self.serve_api:
+            self.start_api()
+        try:
+            # Catch-up runs in the background so a long fetch does not hold up the schedule
+            catch_up = threading.Thread(target=self.catch_up, name="daemon-catch-up", daemon=True)
+            self._threads.add(catch_up)
+            catch_up.start()
+            self.schedule_jobs()
+            while not self._stop.wait(1):
+                self.scheduler.run_pending()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        self._stop.set()
+        self.scheduler.clear()
+        logging.info("Daemon: stopping, waiting for running jobs")
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for thread in list(self._threads):
+            thread.join(max(0, deadline - time.monotonic()))
+        if any(thread.is_alive() for thread in self._threads):
+            logging.warning(f"Daemon: jobs still running after {SHUTDOWN_TIMEOUT:.0f}s, exiting anyway")
+        dashboard_data.refresher.stop()
+        if self._server is not None:
+            self._server.shutdown()
+        db.get_engine().dispose()
+        logging.info("Daemon: stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline jobs on a schedule in one resident process.")
+    parser.add_argument('--no-api', action='store_true', help="do not serve the API in this process (one is already running)")
+    parser.add_argument('--once', action='store_true', help="run every job once in order and exit")
+    args = parser.parse_args()
+
+    logging.getLogger().addHandler(logging.StreamHandler())
+    daemon = PipelineDaemon(serve_api=not args.no_api)
+    if args.once:
+        if daemon.serve_api:
+            daemon.start_api()
+        for name in daemon.jobs:
+            daemon.run_job(name)
+        daemon.shutdown()
+    else:
+        daemon.run()
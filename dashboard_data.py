@@ -0,0 +1,150 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import columnar_index
+import metrics
+import rollups
+from aggregates import Aggregates
+from figure_cache import FigureCache, to_json
+from refresher import AggregateRefresher
+
+# Data layer shared by dashboard.py and new_dash.py: one refreshed snapshot of the
+# aggregates, filtered views of it and the cache of rendered figures and metric cards.
+
+# How often the dashboards check the feature store for new data, in seconds
+REFRESH_INTERVAL = int(os.getenv('DASHBOARD_REFRESH_SECONDS', 60))
+
+# Local copy of the latest aggregates, served at startup while the database is slow or down
+SNAPSHOT_PATH = os.getenv('DASHBOARD_SNAPSHOT_PATH')
+
+# Filter values meaning "everything": (start, end, regions, productids, freeship)
+NO_FILTERS = (None, None, (), (), None)
+MAX_FILTERED_VIEWS = 16
+
+
+def load_index(previous, daily):
+    """The columnar filter index, updated from the previous snapshot's when there is one.
+
+    Only the rows updated since the previous watermark are read and merged in.
+    Every row is read again when there is no previous index, or when the merged
+    one does not add up to the daily rollup.
+    """
+    if previous is not None and previous[0] is not None and previous[0][0] is not None:
+        (high_water_mark, _), data = previous
+        rows = columnar_index.load_rows(updated_after=high_water_mark)
+        index = columnar_index.merge_index(data['index'], rows)
+        if columnar_index.matches_rollups(index, daily):
+            return index, 'incremental'
+        logging.info("Dashboard index does not match the rollups; reading every row")
+    return columnar_index.build_index(columnar_index.load_rows()), 'full'
+
+
+def load_data(previous=None):
+    """Read the rollups maintained by insert_to_sql and update the columnar filter index.
+
+    Aggregates used by any registered plot are computed here, in the background,
+    so the first render after a refresh does not pay for them. previous is the
+    (watermark, data) being replaced, if any.
+    """
+    from plots import PLOTS
+    with metrics.timed('dashboard_load') as timer:
+        tables = rollups.load_rollups()
+        aggs = Aggregates(tables, previous=previous[1]['aggregates'] if previous is not None else None)
+        aggs.compute({name for spec in PLOTS.values() for name in spec['aggregates']})
+        index, mode = load_index(previous, tables['daily'])
+        timer.labels['mode'] = mode
+        timer.rows = len(index['days'])
+    return {'aggregates': aggs, 'index': index}
+
+
+# Loaded on first use and recomputed in the background whenever the loader commits
+# new data. Importing this module does not touch the database.
+refresher = AggregateRefresher(load_data, rollups.data_watermark, interval=REFRESH_INTERVAL, snapshot_path=SNAPSHOT_PATH)
+
+# Serialized figures and metric cards per (plot, filters, data version), shared by all users.
+# Set FIGURE_CACHE_DIR to also share them between worker processes; the directories of
+# other versions are removed once no worker has written to them for FIGURE_CACHE_STALE_SECONDS.
+figures = FigureCache(
+    max_entries=int(os.getenv('FIGURE_CACHE_SIZE', 128)),
+    cache_dir=os.getenv('FIGURE_CACHE_DIR'),
+    stale_after=int(os.getenv('FIGURE_CACHE_STALE_SECONDS', 300))
+)
+
+# Aggregates of recently used filter combinations, shared by the plot and metric callbacks
+_filtered = OrderedDict()
+_filtered_lock = threading.Lock()
+
+
+def current_snapshot():
+    """(version, data) for a callback; the first call loads the data and starts the background refresh."""
+    refresher.load_snapshot_file()
+    refresher.start()
+    return refresher.snapshot()
+
+
+def warmup():
+    """Load the data before the first request: from the snapshot file if there is one, else from the database."""
+    if not refresher.load_snapshot_file():
+        refresher.refresh()
+    refresher.start()
+
+
+def normalize_filters(start_date=None, end_date=None, regions=None, productids=None, freeship='all'):
+    """Filter control values as a hashable tuple, used in cache keys."""
+    return (
+        start_date[:10] if start_date else None,
+        end_date[:10] if end_date else None,
+        tuple(sorted(regions or ())),
+        tuple(sorted(int(p) for p in productids or ())),
+        {'yes': True, 'no': False}.get(freeship),
+    )
+
+
+def filtered_aggregates(version, data, filters):
+    """The Aggregates for a filter combination, or None when no rows match."""
+    if filters == NO_FILTERS:
+        return data['aggregates']
+    key = (str(version), filters)
+    with _filtered_lock:
+        if key in _filtered:
+            _filtered.move_to_end(key)
+            return _filtered[key]
+
+    start, end, regions, productids, freeship = filters
+    index = data['index']
+    with metrics.timed('dashboard_filter') as timer:
+        mask = columnar_index.filter_mask(index, start, end, regions, productids, freeship)
+        timer.rows = int(mask.sum())
+        aggs = Aggregates(columnar_index.rollups_for(index, mask)) if timer.rows else None
+
+    with _filtered_lock:
+        _filtered[key] = aggs
+        while len(_filtered) > MAX_FILTERED_VIEWS:
+            _filtered.popitem(last=False)
+    return aggs
+
+
+def render(kind, plot_id, filters=NO_FILTERS):
+    """The figure ('figure') or metric cards ('metrics') of a plot as JSON-ready data, from the cache when possible."""
+    import plots
+    build = plots.build_figure if kind == 'figure' else plots.build_metrics
+    def build_json():
+        # Only runs on a cache miss
+        with metrics.timed('dashboard_build', kind=kind, plot=plot_id) as timer:
+            body = to_json(build(plot_id, filtered_aggregates(version, data, filters)))
+            timer.bytes = len(body)
+        return body
+
+    with metrics.timed('dashboard_callback', kind=kind, plot=plot_id):
+        version, data = current_snapshot()
+        key = (kind, plot_id, filters, str(version))
+        return json.loads(figures.get_or_build(key, build_json))
+
+
+def filter_options():
+    """Values offered by the dashboard filters for the loaded data."""
+    version, data = current_snapshot()
+    return columnar_index.filter_options(data['index'])
@@ -0,0 +1,74 @@
+import os
+import threading
+
+import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import URL
+
+load_dotenv()
+
+# Get credentials from environment variables
+db_host = os.getenv('DB_HOST')
+db_name = os.getenv('DB_NAME')
+db_user = os.getenv('DB_USER')
+db_password = os.getenv('DB_PASSWORD')
+
+# Connection pool settings
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))        # seconds before a connection is replaced
+STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 60000))  # 0 disables the timeout
+READ_CHUNK_ROWS = int(os.getenv('DB_READ_CHUNK_ROWS', 50000))
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """The process-wide SQLAlchemy engine, created with its connection pool on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            url = URL.create(
+                "postgresql+psycopg2",
+                username=db_user, password=db_password, host=db_host, database=db_name
+            )
+            _engine = create_engine(
+                url,
+                pool_size=POOL_SIZE,
+                max_overflow=MAX_OVERFLOW,
+                pool_recycle=POOL_RECYCLE,
+                pool_pre_ping=True,  # drop connections the server closed while they sat in the pool
+                connect_args={'options': f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"},
+            )
+        return _engine
+
+
+def get_db_connection():
+    """Borrow a raw psycopg2 connection from the pool; close() gives it back."""
+    return get_engine().raw_connection()
+
+
+def set_local_statement_timeout(cur, timeout_ms):
+    """Override the statement timeout for the rest of the current transaction only."""
+    cur.execute("SELECT set_config('statement_timeout', %s, true)", (str(int(timeout_ms)),))
+
+
+def read_sql(query, params=None):
+    """Run a query on a pooled connection and return the result as a DataFrame."""
+    with get_engine().connect() as conn:
+        return pd.read_sql(text(query), conn, params=params)
+
+
+def read_sql_chunks(query, params=None, chunksize=READ_CHUNK_ROWS):
+    """Stream a large result through a server-side cursor, chunksize rows at a time."""
+    with get_engine().connect().execution_options(stream_results=True, max_row_buffer=chunksize) as conn:
+        for chunk in pd.read_sql(text(query), conn, params=params, chunksize=chunksize):
+            yield chunk
+
+
+def read_large_sql(query, params=None, chunksize=READ_CHUNK_ROWS):
+    """Read a large result through a server-side cursor into a single DataFrame."""
+    chunks = list(read_sql_chunks(query, params, chunksize))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
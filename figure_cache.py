@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+from plotly.utils import PlotlyJSONEncoder
+
+
+class FigureCache:
+    """Bounded LRU cache of serialized figures and metric cards, keyed by data version.
+
+    Keys are (kind, plot id, filters, data version) tuples and values are JSON
+    strings. Entries for older data versions are dropped from memory as soon as
+    a newer version is stored. With a cache_dir, entries are also written to
+    disk so every worker process serving the dashboard shares them. Workers
+    switch versions at slightly different times, so on disk only the
+    directories of other versions that no worker has written to for
+    stale_after seconds are removed.
+    """
+
+    def __init__(self, max_entries=128, cache_dir=None, stale_after=300):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.stale_after = stale_after
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _key_path(self, key):
+        version_dir = hashlib.sha1(str(key[-1]).encode()).hexdigest()[:16]
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, version_dir, f"{name}.json")
+
+    def _switch_version(self, version):
+        """Forget every entry that belongs to another data version (caller holds the lock)."""
+        if version == self._version:
+            return
+        self._version = version
+        for key in [k for k in self._entries if k[-1] != version]:
+            del self._entries[key]
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            self._remove_stale_versions(os.path.dirname(self._key_path(('', version))))
+
+    def _remove_stale_versions(self, current):
+        # A worker still on another version keeps writing to its directory, so that one stays
+        cutoff = time.time() - self.stale_after
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stale = path != current and os.path.getmtime(path) < cutoff
+            except OSError:
+                continue  # removed by another worker meanwhile
+            if stale:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def get(self, key):
+        """The cached JSON for key, or None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        if self.cache_dir:
+            try:
+                with open(self._key_path(key)) as f:
+                    value = f.read()
+            except OSError:
+                value = None
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _store(self, key, value):
+        self._switch_version(key[-1])
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+        if self.cache_dir:
+            path = self._key_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as f:
+                    f.write(value)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logging.warning(f"Could not write figure cache entry: {e}")
+
+    def get_or_build(self, key, build):
+        """Return the cached JSON for key, calling build() (which returns JSON) on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits + self.disk_hits) / lookups if lookups else None,
+                'data_version': self._version,
+            }
+
+
+def to_json(value):
+    """Serialize a Plotly figure or a tree of Dash components for the cache."""
+    return json.dumps(value, cls=PlotlyJSONEncoder)
@@ -1,26 +1,40 @@
 import requests
-import psycopg2
+from psycopg2.extras import execute_values
+import pandas as pd
+import pyarrow as pa
+import io
 import json
 from datetime import datetime
-from dotenv import load_dotenv
 import os
+import db
+import metrics
+import rollups
+import schema
+import storage
 
 # os.chdir(r"D:\MSBA\Courses\Fall_2024\BZAN545\Assignments\Group_ASS\final_project\python_code")
 # os.getcwd()
 
-load_dotenv()
+# Columns of the feature_store table, in load order, and its primary key
+COLUMNS = schema.COLUMNS
+KEY_COLUMNS = ['salesdate', 'productid', 'region']
 
-# Get credentials from environment variables
-db_host = os.getenv('DB_HOST')
-db_name = os.getenv('DB_NAME')
-db_user = os.getenv('DB_USER')
-db_password = os.getenv('DB_PASSWORD')
+# 'incremental' upserts rows updated since the last sync, 'full' drops and reloads the table
+SYNC_MODE = os.getenv('SYNC_MODE', 'incremental')
+
+# Where the loader reads rows: 'store' (the partitioned Parquet store), 'csv' (the legacy
+# feature_store.csv) or 'api' (the Flask /data endpoint, which then has to be running)
+SYNC_SOURCE = os.getenv('SYNC_SOURCE', 'store')
+
+# How rows are sent to PostgreSQL: 'copy' (COPY FROM STDIN), 'values' (batched INSERT) or 'rows' (one INSERT per row)
+LOAD_METHOD = os.getenv('LOAD_METHOD', 'copy')
+LOAD_CHUNK_ROWS = int(os.getenv('LOAD_CHUNK_ROWS', 50000))
+# Bulk loads can legitimately outlast the pool-wide statement timeout; 0 disables it for the load
+LOAD_STATEMENT_TIMEOUT_MS = int(os.getenv('LOAD_STATEMENT_TIMEOUT_MS', 0))
 
 def get_db_connection():
-    """Establish a connection to PostgreSQL."""
-    return psycopg2.connect(
-        dbname=db_name, user=db_user, password=db_password, host=db_host
-    )
+    """Borrow a pooled connection to PostgreSQL (close() returns it to the pool)."""
+    return db.get_db_connection()
 
 def fetch_data_from_api(api_url):
     """Fetch JSON data from the API."""
@@ -28,66 +42,320 @@ def fetch_data_from_api(api_url):
     response.raise_for_status()  # Raise an error if the request fails
     return response.json()
 
+def fetch_frame_from_api(api_url, updated_after=None):
+    """Fetch the data from the API as an Arrow stream straight into a DataFrame."""
+    params = {"format": "arrow"}
+    if updated_after is not None:
+        params["updated_after"] = updated_after.isoformat()
+    response = requests.get(api_url, params=params, stream=True)
+    response.raise_for_status()  # Raise an error if the request fails
+    return pa.ipc.open_stream(response.raw).read_pandas()
+
+def filter_updated_after(df, updated_after):
+    """Rows with update_time at or after updated_after (the same rule as /data?updated_after=)."""
+    if updated_after is None:
+        return df
+    return df[schema.parse_update_time(df['update_time']) >= pd.Timestamp(updated_after)]
+
+def read_batches(source, api_url=None, updated_after=None, chunk_size=LOAD_CHUNK_ROWS, after_version=None):
+    """DataFrames of the rows updated at or after updated_after, read from source in chunks.
+
+    'store' and 'csv' read the feature store files directly, without the API's JSON/HTTP hop.
+    For 'store', after_version (the store version of the last sync) reads only the
+    part files appended since, instead of scanning and filtering every part.
+    """
+    if source == 'api':
+        batches = [fetch_frame_from_api(api_url, updated_after=updated_after)]
+    elif source == 'store' and after_version is not None:
+        batches = storage.iter_store_batches(chunk_size, columns=COLUMNS, after_version=after_version)
+    elif source == 'store':
+        storage.ensure_store()
+        batches = (filter_updated_after(batch, updated_after)
+                   for batch in storage.iter_store_batches(chunk_size, columns=COLUMNS))
+    elif source == 'csv':
+        batches = (filter_updated_after(schema.to_canonical(batch), updated_after)
+                   for batch in pd.read_csv(storage.CSV_PATH, chunksize=chunk_size, dtype=schema.CSV_DTYPES))
+    else:
+        raise ValueError(f"Unknown sync source: {source}")
+    yield from metrics.timed_iter('sql_read', batches, count=lambda batch: (len(batch), 0), source=source)
+
 def format_date(date_str):
     """Format the date to match PostgreSQL format."""
     return datetime.strptime(date_str, "%m/%d/%Y").strftime("%Y-%m-%d")
 
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS feature_store (
+    salesdate DATE,
+    productid INT,
+    region text,
+    freeship BOOLEAN,
+    discount FLOAT,
+    itemssold INT,
+    update_time TIMESTAMP,
+    PRIMARY KEY (salesdate, productid, region)
+);
+CREATE TABLE IF NOT EXISTS feature_store_sync_state (
+    table_name text PRIMARY KEY,
+    high_water_mark TIMESTAMP,
+    synced_at TIMESTAMP NOT NULL DEFAULT now()
+);
+-- Store version (see storage.store_version) of the last sync from the Parquet store
+ALTER TABLE feature_store_sync_state ADD COLUMN IF NOT EXISTS store_version BIGINT;
+"""
+
+def recreate_table(cur):
+    """Drop the table and create it empty (full reload)."""
+    cur.execute("drop table if exists feature_store;")
+    cur.execute(CREATE_TABLE_SQL)
+    cur.execute("DELETE FROM feature_store_sync_state WHERE table_name = 'feature_store'")
+    rollups.reset(cur)
+
 def create_table_if_not_exists(cur):
-    """Create the table if it does not exist."""
-    create_table_sql = """
-    drop table if exists feature_store;
-    CREATE TABLE IF NOT EXISTS feature_store (
-        salesdate DATE,
-        productid INT,
-        region text,
-        freeship BOOLEAN,
-        discount FLOAT,
-        itemssold INT,
-        update_time TIMESTAMP
-    );
-    """
-    cur.execute(create_table_sql)
-
-def load_data_to_db(data):
-    """Insert JSON data into PostgreSQL."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-
-    try:
-        # Create table if not exists
-        create_table_if_not_exists(cur)
-
-        for item in data:
-            salesdate = format_date(item['salesdate'])
-            # Explicitly convert freeship to a boolean (1 becomes TRUE, 0 becomes FALSE)
-            freeship = True if item['freeship'] == 1 else False
-            
-            # Insert data into the table
-            cur.execute(
-                """
-                INSERT INTO feature_store (salesdate, productid, region, freeship, discount, itemssold, update_time)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """,
-                (
-                    salesdate, 
-                    item['productid'], 
-                    item['region'],
-                    freeship,  
-                    item['discount'], 
-                    item['itemssold'], 
-                    item['update_time']
-                )
+    """Create the table if it does not exist; returns True if it had to be (re)created empty."""
+    cur.execute("SELECT to_regclass('feature_store') IS NOT NULL")
+    exists = cur.fetchone()[0]
+    if exists:
+        cur.execute("""
+            SELECT count(*) FROM pg_constraint
+            WHERE conrelid = 'feature_store'::regclass AND contype = 'p'
+        """)
+        if cur.fetchone()[0]:
+            cur.execute(CREATE_TABLE_SQL)  # make sure the sync state table exists too
+            if rollups.create_tables(cur):
+                rollups.rebuild(cur)  # first run since the rollups were introduced
+            return False
+    # Missing, or a table from the old drop-and-reload loader without a primary key
+    recreate_table(cur)
+    return True
+
+def get_high_water_mark(cur):
+    """Latest update_time already synced into feature_store, or None before the first sync."""
+    return get_sync_state(cur)[0]
+
+def get_sync_state(cur):
+    """(high-water mark, store version) of the last sync; each is None if not known yet."""
+    cur.execute("""
+        SELECT high_water_mark, store_version FROM feature_store_sync_state WHERE table_name = 'feature_store'
+    """)
+    row = cur.fetchone()
+    return row if row else (None, None)
+
+def set_high_water_mark(cur, high_water_mark, store_version=None):
+    """Record the sync state; a store_version of None keeps the one already recorded."""
+    cur.execute("""
+        INSERT INTO feature_store_sync_state (table_name, high_water_mark, store_version, synced_at)
+        VALUES ('feature_store', %s, %s, now())
+        ON CONFLICT (table_name) DO UPDATE
+        SET high_water_mark = EXCLUDED.high_water_mark,
+            store_version = coalesce(EXCLUDED.store_version, feature_store_sync_state.store_version),
+            synced_at = EXCLUDED.synced_at
+    """, (high_water_mark, store_version))
+
+def prepare_frame(data):
+    """Vectorized conversion of records (API JSON or canonical frames) to the column types of the feature_store table."""
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data, columns=COLUMNS)
+    df = schema.to_canonical(df[COLUMNS])
+    # freeship is now a boolean (1 became TRUE); the table's FLOAT is double precision
+    df = df.assign(discount=schema.discount_as_float64(df['discount']), region=df['region'].astype(object))
+    # Older data repeats some keys; rows arrive in append order, so the last one is the newest
+    return df.drop_duplicates(subset=KEY_COLUMNS, keep='last')
+
+def copy_rows(cur, df, chunk_size=LOAD_CHUNK_ROWS, table='feature_store'):
+    """Stream rows into table with COPY FROM STDIN, chunk_size rows per COPY."""
+    copy_sql = f"COPY {table} ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+    for start in range(0, len(df), chunk_size):
+        with metrics.timed('sql_copy', table=table) as timer:
+            buffer = io.StringIO()
+            df.iloc[start:start + chunk_size].to_csv(buffer, index=False, header=False)
+            timer.rows, timer.bytes = min(chunk_size, len(df) - start), buffer.tell()
+            buffer.seek(0)
+            cur.copy_expert(copy_sql, buffer)
+
+def insert_rows_batched(cur, df, chunk_size=LOAD_CHUNK_ROWS, table='feature_store'):
+    """Insert rows with multi-row INSERT statements, chunk_size rows per round-trip."""
+    insert_sql = f"INSERT INTO {table} ({', '.join(COLUMNS)}) VALUES %s"
+    rows = list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+    execute_values(cur, insert_sql, rows, page_size=chunk_size)
+
+def insert_rows_one_by_one(cur, data):
+    """Original loader: one INSERT and one round-trip per record (kept for comparison).
+    salesdate may be upstream text (9/11/2024) or, in canonical frames, a Timestamp."""
+    for item in data:
+        salesdate = item['salesdate']
+        salesdate = format_date(salesdate) if isinstance(salesdate, str) else pd.Timestamp(salesdate).date()
+        # Explicitly convert freeship to a boolean (1 becomes TRUE, 0 becomes FALSE)
+        freeship = True if item['freeship'] == 1 else False
+        
+        # Insert data into the table
+        cur.execute(
+            """
+            INSERT INTO feature_store (salesdate, productid, region, freeship, discount, itemssold, update_time)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """,
+            (
+                salesdate, 
+                item['productid'], 
+                item['region'],
+                freeship,  
+                item['discount'], 
+                item['itemssold'], 
+                None if pd.isna(item['update_time']) else item['update_time']
             )
-        conn.commit()
-        print("Data loaded successfully.")
-    except Exception as e:
-        conn.rollback()
-        print(f"Failed to load data: {e}")
-    finally:
-        cur.close()
-        conn.close()
+        )
+
+def load_data_to_db(data, method=LOAD_METHOD, chunk_size=LOAD_CHUNK_ROWS):
+    """Replace the contents of feature_store with records (a list of dicts or a DataFrame)."""
+    with metrics.timed('sql_load', method=method) as timer:
+        conn = get_db_connection()
+        cur = conn.cursor()
+
+        try:
+            db.set_local_statement_timeout(cur, LOAD_STATEMENT_TIMEOUT_MS)
+            recreate_table(cur)
+
+            df = prepare_frame(data)
+            timer.rows = len(df)
+            if method == 'rows':
+                insert_rows_one_by_one(cur, df.to_dict(orient="records"))
+            elif method == 'values':
+                insert_rows_batched(cur, df, chunk_size)
+            elif method == 'copy':
+                copy_rows(cur, df, chunk_size)
+            else:
+                raise ValueError(f"Unknown load method: {method}")
+            rollups.rebuild(cur)
+            cur.execute("SELECT max(update_time) FROM feature_store")
+            set_high_water_mark(cur, cur.fetchone()[0])
+            conn.commit()
+            print("Data loaded successfully.")
+        except Exception as e:
+            conn.rollback()
+            timer.status = 'error'
+            print(f"Failed to load data: {e}")
+        finally:
+            cur.close()
+            conn.close()
+
+# One row per key from the staging table: the newest one wins
+BATCH_SQL = f"""
+CREATE TEMP TABLE feature_store_batch ON COMMIT DROP AS
+SELECT DISTINCT ON (salesdate, productid, region) {', '.join(COLUMNS)}
+FROM feature_store_staging
+ORDER BY salesdate, productid, region, update_time DESC NULLS LAST, seq DESC
+"""
+
+UPSERT_SQL = f"""
+INSERT INTO feature_store ({', '.join(COLUMNS)})
+SELECT {', '.join(COLUMNS)} FROM feature_store_batch
+ON CONFLICT (salesdate, productid, region) DO UPDATE
+SET freeship = EXCLUDED.freeship,
+    discount = EXCLUDED.discount,
+    itemssold = EXCLUDED.itemssold,
+    update_time = EXCLUDED.update_time
+WHERE (feature_store.freeship, feature_store.discount, feature_store.itemssold, feature_store.update_time)
+    IS DISTINCT FROM (EXCLUDED.freeship, EXCLUDED.discount, EXCLUDED.itemssold, EXCLUDED.update_time)
+"""
+
+def upsert_rows(cur, df, chunk_size=LOAD_CHUNK_ROWS):
+    """Load raw rows into a temporary staging table and merge them into feature_store by primary key,
+    updating the dashboard rollups by the same delta. Returns (rows upserted, newest update_time)."""
+    return upsert_batches(cur, [df], chunk_size)[1:]
+
+def upsert_batches(cur, batches, chunk_size=LOAD_CHUNK_ROWS):
+    """upsert_rows for an iterable of raw DataFrames, each COPYed into staging as it arrives.
+
+    Returns (rows read, rows inserted or updated, newest update_time read).
+    """
+    cur.execute("""
+        CREATE TEMP TABLE feature_store_staging (
+            seq BIGSERIAL,
+            salesdate DATE,
+            productid INT,
+            region text,
+            freeship BOOLEAN,
+            discount FLOAT,
+            itemssold INT,
+            update_time TIMESTAMP
+        ) ON COMMIT DROP
+    """)
+    rows = 0
+    for batch in batches:
+        if not batch.empty:
+            # Keys repeated across batches are resolved by seq when the batch table is built
+            copy_rows(cur, prepare_frame(batch), chunk_size, table='feature_store_staging')
+            rows += len(batch)
+    if not rows:
+        return 0, 0, None
+    with metrics.timed('sql_merge') as timer:
+        cur.execute(BATCH_SQL)
+        rollups.apply_batch(cur, 'feature_store_batch')  # needs the rows' values from before the upsert
+        cur.execute(UPSERT_SQL)
+        upserted = timer.rows = cur.rowcount
+    cur.execute("SELECT max(update_time) FROM feature_store_staging")
+    return rows, upserted, cur.fetchone()[0]
+
+def sync_data_to_db(api_url=None, chunk_size=LOAD_CHUNK_ROWS, source=SYNC_SOURCE, full=False):
+    """Upsert only the rows updated since the last sync (the high-water mark) into feature_store.
+
+    source is where rows are read (see SYNC_SOURCE); api_url is only used by 'api'.
+    full=True empties the table first and reloads every row. Returns True if the
+    sync succeeded (including when there was nothing new).
+    """
+    with metrics.timed('sql_sync', source=source) as timer:
+        conn = get_db_connection()
+        cur = conn.cursor()
+
+        try:
+            db.set_local_statement_timeout(cur, LOAD_STATEMENT_TIMEOUT_MS)
+            if full:
+                recreate_table(cur)
+                created = True
+            else:
+                created = create_table_if_not_exists(cur)
+            high_water_mark, synced_version = (None, None) if created else get_sync_state(cur)
+
+            store_version = None
+            if source == 'store':
+                storage.ensure_store()
+                # Read before the rows: parts appended during the sync are just read again next time
+                store_version = storage.store_version()
+                if synced_version is not None and synced_version > store_version:
+                    synced_version = None  # the store was recreated; fall back to the high-water mark
+
+            # Rows updated at the high-water mark itself are read again; the upsert makes that harmless
+            batches = read_batches(source, api_url, high_water_mark, chunk_size,
+                                   after_version=synced_version if source == 'store' else None)
+            fetched, upserted, batch_high_water_mark = upsert_batches(cur, batches, chunk_size)
+            timer.rows = fetched
+            version_moved = store_version is not None and store_version != synced_version
+            if not fetched:
+                if version_moved:
+                    set_high_water_mark(cur, high_water_mark, store_version)
+                conn.commit()
+                print("No new data to load.")
+                return True
+
+            new_high_water_mark = high_water_mark
+            if high_water_mark is None or (batch_high_water_mark and batch_high_water_mark > high_water_mark):
+                new_high_water_mark = batch_high_water_mark
+            if upserted or new_high_water_mark != high_water_mark or version_moved:
+                set_high_water_mark(cur, new_high_water_mark, store_version)  # also bumps synced_at for watchers
+            conn.commit()
+            print(f"Data synced successfully: {fetched} rows read from {source}, {upserted} inserted or updated.")
+            return True
+        except Exception as e:
+            conn.rollback()
+            timer.status = 'error'
+            print(f"Failed to sync data: {e}")
+            return False
+        finally:
+            cur.close()
+            conn.close()
 
 if __name__ == "__main__":
     api_url = "http://127.0.0.1:5000/data" 
-    data = fetch_data_from_api(api_url)
-    load_data_to_db(data)
+    if SYNC_MODE == 'full' and SYNC_SOURCE == 'api':
+        data = fetch_frame_from_api(api_url)
+        load_data_to_db(data)
+    else:
+        sync_data_to_db(api_url, full=SYNC_MODE == 'full')
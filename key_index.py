@@ -0,0 +1,131 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import storage
+
+# Columns that uniquely identify a record in the feature store
+INDEX_KEYS = ['salesdate', 'productid', 'region']
+
+MANIFEST_NAME = "manifest.json"
+
+
+def index_dir_for(store_dir):
+    """The key index lives inside the store it indexes."""
+    return os.path.join(store_dir, "_key_index")
+
+
+def hash_keys(rows):
+    """Return the partition date and a 64-bit hash of the record key for every row."""
+    dates = storage.partition_dates(rows['salesdate'])
+    # Build one normalized string key per row so hashes are stable across dtypes
+    keys = dates + "|" + rows['productid'].astype('int64').astype(str) + "|" + rows['region'].astype(str)
+    hashes = pd.util.hash_array(keys.to_numpy(dtype=object))
+    return dates.to_numpy(dtype=object), hashes
+
+
+def source_signature(store_dir):
+    """Version of the store the index was built from."""
+    return {'version': storage.store_version(store_dir)}
+
+
+def _read_manifest(index_dir):
+    manifest_path = os.path.join(index_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(index_dir, manifest):
+    manifest_path = os.path.join(index_dir, MANIFEST_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def _partition_path(index_dir, date):
+    return os.path.join(index_dir, f"{date}.npy")
+
+
+def _load_partition(index_dir, date):
+    path = _partition_path(index_dir, date)
+    if not os.path.exists(path):
+        return np.empty(0, dtype=np.uint64)
+    return np.load(path)
+
+
+def _save_partition(index_dir, date, hashes):
+    path = _partition_path(index_dir, date)
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, hashes)
+    os.replace(tmp_path, path)
+
+
+def index_is_stale(store_dir):
+    """True when the index is missing or was not built from the current store version."""
+    manifest = _read_manifest(index_dir_for(store_dir))
+    if manifest is None:
+        return True
+    return manifest.get('source') != source_signature(store_dir)
+
+
+def rebuild_index(store_dir):
+    """Rebuild every salesdate partition of the key index from the store."""
+    index_dir = index_dir_for(store_dir)
+    os.makedirs(index_dir, exist_ok=True)
+    for name in os.listdir(index_dir):
+        if name.endswith(".npy"):
+            os.remove(os.path.join(index_dir, name))
+
+    partitions = {}
+    keys = storage.read_store(columns=INDEX_KEYS, store_dir=store_dir)
+    if not keys.empty:
+        dates, hashes = hash_keys(keys)
+        for date, group in pd.Series(hashes).groupby(dates):
+            unique = np.unique(group.to_numpy(dtype=np.uint64))
+            _save_partition(index_dir, date, unique)
+            partitions[date] = len(unique)
+
+    _write_manifest(index_dir, {'source': source_signature(store_dir), 'partitions': partitions})
+
+
+def filter_new_rows(rows, store_dir=storage.STORE_DIR):
+    """Return the rows whose key is not yet in the store, touching only their salesdate partitions."""
+    if rows.empty:
+        return rows
+    if index_is_stale(store_dir):
+        rebuild_index(store_dir)
+    index_dir = index_dir_for(store_dir)
+
+    dates, hashes = hash_keys(rows)
+    is_new = np.ones(len(rows), dtype=bool)
+    for date in pd.unique(dates):
+        in_partition = dates == date
+        existing = _load_partition(index_dir, date)
+        if len(existing):
+            is_new[in_partition] = ~np.isin(hashes[in_partition], existing, assume_unique=False)
+    return rows[is_new].copy()
+
+
+def update_index(rows, store_dir=storage.STORE_DIR):
+    """Add the keys of rows just appended to the store and record its new version."""
+    index_dir = index_dir_for(store_dir)
+    manifest = _read_manifest(index_dir) or {'partitions': {}}
+    partitions = manifest.get('partitions', {})
+
+    if not rows.empty:
+        os.makedirs(index_dir, exist_ok=True)
+        dates, hashes = hash_keys(rows)
+        for date in pd.unique(dates):
+            merged = np.union1d(_load_partition(index_dir, date), hashes[dates == date])
+            _save_partition(index_dir, date, merged)
+            partitions[date] = len(merged)
+
+    _write_manifest(index_dir, {'source': source_signature(store_dir), 'partitions': partitions})
@@ -0,0 +1,232 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import storage
+
+# Process-wide counters and histograms for the hot pipeline stages. They are
+# exported in the Prometheus text format by the /metrics endpoints (see render),
+# and every timed stage is also written as one JSON line to METRICS_LOG_PATH.
+# Each process (API, dashboard, fetcher, loader) keeps its own values.
+
+# JSON lines log of timed stages; set METRICS_LOG_PATH to an empty string to send them to the root logger instead
+METRICS_LOG_PATH = os.getenv('METRICS_LOG_PATH', os.path.join(storage.DATA_DIR, "feature_store_metrics.log"))
+
+# Upper bounds of the duration histograms, in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Content type of render()'s output
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Type and help text of the metrics recorded by the pipeline
+METRICS = {
+    'pipeline_stage_seconds': ('histogram', "Time spent in a pipeline stage"),
+    'pipeline_stage_runs_total': ('counter', "Pipeline stage runs by outcome"),
+    'pipeline_stage_rows_total': ('counter', "Rows processed by a pipeline stage"),
+    'pipeline_stage_bytes_total': ('counter', "Bytes processed by a pipeline stage"),
+    'fetch_sources_total': ('counter', "Upstream source fetches by outcome"),
+    'http_requests_total': ('counter', "HTTP requests served, by path and status code"),
+    'online_lookup_seconds': ('histogram', "Latency of online feature vector lookups, single or batch"),
+}
+
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> {'buckets': [...], 'counts': [...], 'sum': float, 'count': int}
+_lock = threading.Lock()
+
+_log = logging.getLogger('feature_store.metrics')
+_log_configured = False
+
+
+def _key(metric, labels):
+    return metric, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(metric, value=1, /, **labels):
+    """Add value to a counter."""
+    key = _key(metric, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(metric, value, /, buckets=DEFAULT_BUCKETS, **labels):
+    """Record one observation in a histogram."""
+    key = _key(metric, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(histogram['buckets']):
+            if value <= bound:
+                histogram['counts'][i] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+
+def reset():
+    """Forget every recorded value (for benchmarks and tests)."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+class Timer:
+    """What a timed stage processed; set rows and bytes (or call add) inside the with block."""
+
+    def __init__(self, stage, labels):
+        self.stage = stage
+        self.labels = labels
+        self.rows = None
+        self.bytes = None
+        self.seconds = None
+        self.status = 'ok'
+
+    def add(self, rows=0, nbytes=0):
+        self.rows = (self.rows or 0) + rows
+        self.bytes = (self.bytes or 0) + nbytes
+
+
+def record(timer):
+    """Export a finished stage: duration histogram, run/row/byte counters and a JSON log line.
+
+    Never raises: a metrics problem must not fail the stage it measures.
+    """
+    try:
+        _record(timer)
+    except Exception:
+        logging.exception(f"Failed to record metrics for stage {timer.stage}")
+
+
+def _record(timer):
+    observe('pipeline_stage_seconds', timer.seconds, stage=timer.stage, **timer.labels)
+    inc('pipeline_stage_runs_total', stage=timer.stage, status=timer.status, **timer.labels)
+    if timer.rows is not None:
+        inc('pipeline_stage_rows_total', timer.rows, stage=timer.stage, **timer.labels)
+    if timer.bytes is not None:
+        inc('pipeline_stage_bytes_total', timer.bytes, stage=timer.stage, **timer.labels)
+    log_event('stage', stage=timer.stage, seconds=round(timer.seconds, 6), status=timer.status,
+              rows=timer.rows, bytes=timer.bytes, **timer.labels)
+
+
+@contextmanager
+def timed(stage, **labels):
+    """Time the with block as one run of stage; an exception marks the run as an error and is re-raised."""
+    timer = Timer(stage, labels)
+    start = time.perf_counter()
+    try:
+        yield timer
+    except BaseException:
+        timer.status = 'error'
+        raise
+    finally:
+        timer.seconds = time.perf_counter() - start
+        record(timer)
+
+
+def timed_iter(stage, items, count=None, rows=None, **labels):
+    """Yield from items, timing only the work of producing them (not the consumer's) as one run of stage.
+
+    count(item) returns the (rows, bytes) an item adds; rows sets a known total up front.
+    """
+    timer = Timer(stage, labels)
+    timer.rows = rows
+    timer.seconds = 0.0
+    iterator = iter(items)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                timer.seconds += time.perf_counter() - start
+            if count is not None:
+                timer.add(*count(item))
+            yield item
+    except BaseException:
+        timer.status = 'error'
+        raise
+    finally:
+        record(timer)
+
+
+def _configure_log():
+    global _log_configured
+    _log_configured = True
+    _log.setLevel(logging.INFO)
+    if METRICS_LOG_PATH:
+        handler = logging.FileHandler(METRICS_LOG_PATH, delay=True)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _log.addHandler(handler)
+        _log.propagate = False
+
+
+def log_event(event, **fields):
+    """Write one structured JSON log line."""
+    if not _log_configured:
+        _configure_log()
+    fields = {k: v for k, v in fields.items() if v is not None}
+    _log.info(json.dumps({'ts': datetime.now(timezone.utc).isoformat(), 'event': event, 'pid': os.getpid(), **fields},
+                         default=str))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Every metric of this process in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: {**h, 'counts': list(h['counts'])} for key, h in _histograms.items()}
+
+    lines = []
+    names = sorted({name for name, _ in counters} | {name for name, _ in histograms})
+    for name in names:
+        kind, help_text = METRICS.get(name, ('histogram' if any(n == name for n, _ in histograms) else 'counter', ""))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(histogram['buckets'], histogram['counts']):
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', _format_value(float(bound)))])} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def instrument_flask(server):
+    """Count the requests of a Flask server (the API, or a Dash app's .server) and serve render() at /metrics."""
+    from flask import Response, request
+
+    @server.after_request
+    def count_request(response):
+        path = request.url_rule.rule if request.url_rule else "<unmatched>"  # bounded label values
+        inc('http_requests_total', path=path, status=response.status_code)
+        return response
+
+    @server.route("/metrics")
+    def metrics_endpoint():
+        return Response(render(), mimetype=CONTENT_TYPE)
+
+    return server
@@ -0,0 +1,253 @@
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+import schema
+import storage
+
+# Online store: the feature vector of every (productid, region) entity and salesdate,
+# in a local SQLite file kept next to the Parquet store. Fetch_data upserts every
+# batch it appends, so lookups of one entity's latest (or as-of-date) features take
+# a single primary key seek instead of a read of the whole store. Like the key
+# index, it records the store version it reflects and is rebuilt from the store
+# when it falls behind.
+
+ONLINE_NAME = "_online.sqlite"
+
+# Upper bounds of the lookup latency histograms, in seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+EPOCH_DATE = date(1970, 1, 1)
+EPOCH_DATETIME = datetime(1970, 1, 1)
+LATEST = 2 ** 31  # a day number after any salesdate
+
+CREATE_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS features (
+        productid INTEGER NOT NULL,
+        region TEXT NOT NULL,
+        day INTEGER NOT NULL,      -- salesdate, as days since 1970-01-01
+        freeship INTEGER,
+        discount REAL,
+        itemssold INTEGER,
+        update_time INTEGER,       -- seconds since 1970-01-01, wall-clock time like the store
+        PRIMARY KEY (productid, region, day)
+    ) WITHOUT ROWID
+    """,
+    "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)",
+]
+
+# A key seen again keeps the row with the newest update_time (ties: the later row), as in feature_store
+UPSERT_SQL = """
+INSERT INTO features (productid, region, day, freeship, discount, itemssold, update_time)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (productid, region, day) DO UPDATE
+SET freeship = excluded.freeship,
+    discount = excluded.discount,
+    itemssold = excluded.itemssold,
+    update_time = excluded.update_time
+WHERE coalesce(excluded.update_time, -1) >= coalesce(features.update_time, -1)
+"""
+
+LOOKUP_SQL = """
+SELECT day, freeship, discount, itemssold, update_time FROM features
+WHERE productid = ? AND region = ? AND day <= ?
+ORDER BY day DESC LIMIT 1
+"""
+
+
+def online_path(store_dir):
+    """The online store lives inside the store it mirrors."""
+    return os.path.join(store_dir, ONLINE_NAME)
+
+
+def _connect(store_dir):
+    conn = sqlite3.connect(online_path(store_dir), timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")  # readers are never blocked by the writer
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+@contextmanager
+def _transaction(conn):
+    # Explicit, so the DDL of a rebuild is part of the transaction too
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _stored_version(conn):
+    try:
+        row = conn.execute("SELECT value FROM meta WHERE name = 'store_version'").fetchone()
+    except sqlite3.OperationalError:
+        return None  # not created yet
+    return row[0] if row else None
+
+
+def _set_version(conn, version):
+    conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('store_version', ?)", (version,))
+
+
+def _records(rows):
+    """rows (any frame with the store's columns) as parameter tuples for UPSERT_SQL."""
+    rows = schema.to_canonical(rows)
+    days = (rows['salesdate'].to_numpy(dtype='datetime64[D]') - EPOCH).astype(np.int64)
+    update_times = rows['update_time'].to_numpy(dtype='datetime64[s]')
+    seconds = np.where(np.isnat(update_times), None, update_times.astype(np.int64).astype(object))
+    return zip(
+        rows['productid'].to_numpy().tolist(),
+        rows['region'].astype(str).tolist(),
+        days.tolist(),
+        rows['freeship'].to_numpy().astype(np.int64).tolist(),
+        schema.discount_as_float64(rows['discount']).tolist(),
+        rows['itemssold'].to_numpy().tolist(),
+        seconds.tolist(),
+    )
+
+
+def is_stale(store_dir=storage.STORE_DIR):
+    """True when the online store is missing or was not built from the current store version."""
+    if not os.path.exists(online_path(store_dir)):
+        return True
+    conn = _connect(store_dir)
+    try:
+        return _stored_version(conn) != storage.store_version(store_dir)
+    finally:
+        conn.close()
+
+
+def rebuild(store_dir=storage.STORE_DIR):
+    """Rebuild the online store from every row of the store, in one transaction.
+
+    Lookups keep reading the previous contents until it commits.
+    """
+    version = storage.store_version(store_dir)  # read first: rows appended meanwhile only make it stale
+    conn = _connect(store_dir)
+    try:
+        conn.execute("PRAGMA cache_size = -131072")  # 128 MiB of pages for the bulk insert
+        rows = 0
+        with _transaction(conn):
+            conn.execute("DROP TABLE IF EXISTS features")
+            for statement in CREATE_SQL:
+                conn.execute(statement)
+            for batch in storage.iter_store_batches(columns=schema.COLUMNS, store_dir=store_dir):
+                conn.executemany(UPSERT_SQL, _records(batch))
+                rows += len(batch)
+            _set_version(conn, version)
+        logging.info(f"Online store rebuilt from {rows} rows of store version {version}")
+    finally:
+        conn.close()
+
+
+def update(rows, store_dir=storage.STORE_DIR):
+    """Upsert rows just appended to the store and record its new version.
+
+    Rebuilds from the store instead when the online store missed earlier appends.
+    """
+    version = storage.store_version(store_dir)
+    if not os.path.exists(online_path(store_dir)):
+        rebuild(store_dir)
+        return
+    conn = _connect(store_dir)
+    try:
+        with _transaction(conn):
+            stale = _stored_version(conn) != version - 1
+            if not stale:
+                conn.executemany(UPSERT_SQL, _records(rows))
+                _set_version(conn, version)
+    finally:
+        conn.close()
+    if stale:
+        rebuild(store_dir)
+
+
+def ensure_current(store_dir=storage.STORE_DIR):
+    """Rebuild the online store if it is missing or behind the store; returns True if it was rebuilt."""
+    if is_stale(store_dir):
+        rebuild(store_dir)
+        return True
+    return False
+
+
+def _day(as_of):
+    """Day number of an as-of date (ISO string, date or datetime); None means the latest."""
+    if as_of is None:
+        return LATEST
+    if isinstance(as_of, str):
+        as_of = date.fromisoformat(as_of[:10])
+    elif isinstance(as_of, datetime):
+        as_of = as_of.date()
+    return (as_of - EPOCH_DATE).days
+
+
+def _vector(productid, region, row):
+    day, freeship, discount, itemssold, update_time = row
+    # Same columns, order and formats as the JSON records of /data
+    return {
+        'salesdate': schema.format_salesdate(EPOCH_DATE + timedelta(days=day)),
+        'productid': productid,
+        'region': region,
+        'freeship': freeship,
+        'discount': discount,
+        'itemssold': itemssold,
+        'update_time': None if update_time is None else
+        (EPOCH_DATETIME + timedelta(seconds=update_time)).strftime(schema.UPDATE_TIME_FORMAT),
+    }
+
+
+class OnlineStore:
+    """Read-only feature vector lookups, with one SQLite connection per thread."""
+
+    def __init__(self, store_dir=storage.STORE_DIR):
+        self.path = online_path(store_dir)
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def get(self, productid, region, as_of=None):
+        """Feature vector of one entity on its latest salesdate (at or before as_of if given), or None."""
+        row = self._conn().execute(LOOKUP_SQL, (int(productid), str(region), _day(as_of))).fetchone()
+        return None if row is None else _vector(int(productid), str(region), row)
+
+    def get_many(self, entities, as_of=None):
+        """get for each (productid, region) or (productid, region, as_of) entity, in order.
+
+        as_of applies to the entities that do not carry their own.
+        """
+        conn = self._conn()
+        vectors = []
+        for entity in entities:
+            productid, region = int(entity[0]), str(entity[1])
+            day = _day(entity[2] if len(entity) > 2 else as_of)
+            row = conn.execute(LOOKUP_SQL, (productid, region, day)).fetchone()
+            vectors.append(None if row is None else _vector(productid, region, row))
+        return vectors
+
+    def close(self):
+        """Close the calling thread's connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    storage.ensure_store()
+    rebuild()
+    print(f"Online store rebuilt at {online_path(storage.STORE_DIR)}")
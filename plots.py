@@ -0,0 +1,277 @@
+import dash_bootstrap_components as dbc
+import numpy as np
+from dash import html
+
+# Plot registry shared by dashboard.py and new_dash.py: each plot declares the
+# aggregates (see aggregates.py) it reads, a figure builder and optionally a
+# builder for the metric cards shown above it.
+PLOTS = {}
+
+
+def plot(plot_id, label, aggregates):
+    def register(func):
+        PLOTS[plot_id] = {'label': label, 'aggregates': aggregates, 'figure': func, 'metrics': None}
+        return func
+    return register
+
+
+def metrics(plot_id):
+    def register(func):
+        PLOTS[plot_id]['metrics'] = func
+        return func
+    return register
+
+
+def plot_options(plot_ids):
+    """Dropdown options for the given plots, in that order."""
+    return [{'label': PLOTS[plot_id]['label'], 'value': plot_id} for plot_id in plot_ids]
+
+
+def _plotly():
+    # Imported on the first render rather than at startup
+    import plotly.express as px
+    import plotly.graph_objects as go
+    return px, go
+
+
+def build_figure(plot_id, aggs):
+    """The figure of a registered plot; aggs is an aggregates.Aggregates, or None when no rows match."""
+    if aggs is None:
+        return _plotly()[1].Figure(layout={'title': "No data for the selected filters"})
+    return PLOTS[plot_id]['figure'](aggs)
+
+
+def build_metrics(plot_id, aggs):
+    """The metric cards of a registered plot (an empty row if it has none)."""
+    if aggs is None:
+        return dbc.Row(dbc.Col(html.P("No data for the selected filters.", className="text-muted")))
+    build = PLOTS[plot_id]['metrics'] if plot_id in PLOTS else None
+    return build(aggs) if build else dbc.Row()
+
+
+def metric_card(title, value, note=None, color="primary"):
+    body = [html.H5(title, className="card-title"), html.H2(value, className="card-text")]
+    if note is not None:
+        body.append(html.P(note))
+    return dbc.Col(dbc.Card(dbc.CardBody(body), color=color, inverse=True), width=4)
+
+
+def summary_box_figure(box, title, x_title, y_title):
+    """Box plot drawn from precomputed box statistics (one row per box) instead of raw rows.
+
+    The payload holds a handful of numbers and at most the sampled outliers per
+    box, so it stays the same size however many rows the data has.
+    """
+    px, go = _plotly()
+    fig = go.Figure()
+    colors = px.colors.qualitative.Plotly
+    for i, (name, stats) in enumerate(box.iterrows()):
+        color = colors[i % len(colors)]
+        fig.add_trace(go.Box(
+            name=str(name),
+            x=[str(name)],
+            q1=[stats['q1']],
+            median=[stats['median']],
+            q3=[stats['q3']],
+            lowerfence=[stats['lowerfence']],
+            upperfence=[stats['upperfence']],
+            mean=[stats['mean']],
+            marker_color=color,
+            legendgroup=str(name),
+            hovertext=f"n={stats['count']}",
+        ))
+        if stats['outliers']:
+            fig.add_trace(go.Scatter(
+                x=[str(name)] * len(stats['outliers']),
+                y=stats['outliers'],
+                mode='markers',
+                marker=dict(color=color, size=5),
+                legendgroup=str(name),
+                showlegend=False,
+                name=f"{name} outliers",
+            ))
+    fig.update_layout(title=title, xaxis_title=x_title, yaxis_title=y_title, legend_title_text=x_title)
+    return fig
+
+
+def add_trendline(fig, regression, x):
+    """Draw the fitted line of a RegressionAccumulator across the range of x."""
+    go = _plotly()[1]
+    x_range = np.array([np.nanmin(x), np.nanmax(x)])
+    fig.add_trace(go.Scatter(
+        x=x_range,
+        y=regression.predict(x_range),
+        mode='lines',
+        name='OLS trendline',
+        hovertemplate=(f"y = {regression.slope:.4f} x + {regression.intercept:.2f}<br>"
+                       f"R<sup>2</sup> = {regression.r_squared:.4f}<extra></extra>"),
+    ))
+    return fig
+
+
+@plot('total_items_weekday', '📊 Total Items Sold by Weekday', ['weekday_sales'])
+def total_items_weekday(aggs):
+    px = _plotly()[0]
+    fig = px.bar(
+        aggs['weekday_sales'],
+        x='weekday_name',
+        y='itemssold',
+        title="Total Items Sold by Weekday",
+        labels={'itemssold': 'Items Sold', 'weekday_name': 'Weekday'}
+    )
+    fig.update_layout(xaxis_title="Weekday", yaxis_title="Items Sold")
+    return fig
+
+
+@metrics('total_items_weekday')
+def total_items_weekday_metrics(aggs):
+    total_items_sold = aggs['weekday_sales']['itemssold'].sum()
+    return dbc.Row([metric_card("Total Items Sold", f"{total_items_sold:,}", color="success")])
+
+
+@plot('avg_discount_weekday', '💲 Average Discount by Weekday', ['avg_discount_weekday'])
+def avg_discount_weekday(aggs):
+    px = _plotly()[0]
+    return px.line(
+        aggs['avg_discount_weekday'],
+        x='weekday_name',
+        y='discount',
+        title="Average Discount by Weekday",
+        labels={'discount': 'Average Discount', 'weekday_name': 'Weekday'},
+        markers=True
+    )
+
+
+@metrics('avg_discount_weekday')
+def avg_discount_weekday_metrics(aggs):
+    avg_discount = aggs['avg_discount_weekday'].set_index('weekday_name')['discount']
+    return dbc.Row([
+        metric_card("Highest Average Discount", f"{avg_discount.idxmax()}",
+                    f"Discount: {avg_discount.max():.2f}", color="primary"),
+        metric_card("Lowest Average Discount", f"{avg_discount.idxmin()}",
+                    f"Discount: {avg_discount.min():.2f}", color="danger"),
+    ])
+
+
+@plot('sales_distribution_region', '🍰 Sales Distribution by Region', ['region_sales'])
+def sales_distribution_region(aggs):
+    px = _plotly()[0]
+    return px.pie(
+        aggs['region_sales'],
+        names='region',
+        values='itemssold',
+        title="Sales Distribution by Region"
+    )
+
+
+@metrics('sales_distribution_region')
+def sales_distribution_region_metrics(aggs):
+    sales_by_region = aggs['region_sales'].set_index('region')['itemssold']
+    region_percentages = (sales_by_region / sales_by_region.sum()) * 100
+    return dbc.Row([
+        metric_card("Region with Highest Sales", f"{region_percentages.idxmax()}",
+                    f"Percentage: {region_percentages.max():.1f}%", color="primary"),
+        metric_card("Region with Lowest Sales", f"{region_percentages.idxmin()}",
+                    f"Percentage: {region_percentages.min():.1f}%", color="info"),
+    ])
+
+
+@plot('items_sold_distribution', '📊 Distribution of Items Sold by Weekday',
+      ['weekday_box', 'weekday_medians', 'weekday_iqr'])
+def items_sold_distribution(aggs):
+    # Quartiles, whiskers and sampled outliers are computed server-side from the rollups
+    return summary_box_figure(
+        aggs['weekday_box'],
+        title="Distribution of Items Sold by Weekday",
+        x_title="Weekday",
+        y_title="Items Sold"
+    )
+
+
+@metrics('items_sold_distribution')
+def items_sold_distribution_metrics(aggs):
+    weekday_medians = aggs['weekday_medians']
+    weekday_iqr = aggs['weekday_iqr']
+    return dbc.Row([
+        metric_card("Highest Median Sales", f"{weekday_medians.idxmax()}",
+                    f"Median Items Sold: {weekday_medians.max()}", color="success"),
+        metric_card("Highest Variability (IQR)", f"{weekday_iqr.idxmax()}",
+                    f"IQR: {weekday_iqr.max():.0f}", color="warning"),
+    ])
+
+
+@plot('mean_items_region_weekday', '📈 Mean Items Sold by Region and Weekday', ['mean_items_sold_region_weekday'])
+def mean_items_region_weekday(aggs):
+    px = _plotly()[0]
+    # Sort a copy: the aggregates are shared by every request
+    mean_items_sold_region_weekday = aggs['mean_items_sold_region_weekday'].sort_values('weekday_name')
+    return px.line(
+        mean_items_sold_region_weekday,
+        x='weekday_name',
+        y='itemssold',
+        color='region',
+        title="Mean Items Sold by Region and Weekday",
+        labels={'itemssold': 'Mean Items Sold', 'weekday_name': 'Weekday'},
+        markers=True
+    )
+
+
+@metrics('mean_items_region_weekday')
+def mean_items_region_weekday_metrics(aggs):
+    region_means = aggs['mean_items_sold_region_weekday'].groupby('region')['itemssold'].mean()
+    return dbc.Row([
+        metric_card("Region with Highest Mean Sales", f"{region_means.idxmax()}",
+                    f"Mean Items Sold: {region_means.max():.1f}", color="primary"),
+        metric_card("Region with Lowest Mean Sales", f"{region_means.idxmin()}",
+                    f"Mean Items Sold: {region_means.min():.1f}", color="info"),
+    ])
+
+
+@plot('items_discount_scatter', '📊 Items Sold vs Average Discount Scatter Plot', ['daily_sales', 'daily_regression'])
+def items_discount_scatter(aggs):
+    px = _plotly()[0]
+    fig = px.scatter(
+        aggs['daily_sales'],
+        x='avg_discount',
+        y='total_items_sold',
+        title="Items Sold vs Average Discount",
+        labels={'avg_discount': 'Average Discount', 'total_items_sold': 'Items Sold'}
+    )
+    return add_trendline(fig, aggs['daily_regression'], aggs['daily_sales']['avg_discount'])
+
+
+@metrics('items_discount_scatter')
+def items_discount_scatter_metrics(aggs):
+    regression = aggs['daily_regression']
+    return dbc.Row([
+        metric_card("Regression Slope", f"{regression.slope:.4f}",
+                    "Indicates the impact of discounts on sales.", color="primary"),
+        metric_card("Correlation Coefficient (R)", f"{regression.r:.2f}",
+                    "Measures the strength of the relationship.", color="info"),
+    ])
+
+
+@plot('median_items_region_freeship', '📊 Median Items Sold by Region and Free Shipping',
+      ['median_items_sold_region_freeship'])
+def median_items_region_freeship(aggs):
+    px = _plotly()[0]
+    return px.bar(
+        aggs['median_items_sold_region_freeship'],
+        x='region',
+        y='itemssold',
+        color='freeship',
+        barmode='group',
+        title="Median Items Sold by Region and Free Shipping",
+        labels={'itemssold': 'Median Items Sold', 'region': 'Region', 'freeship': 'Free Shipping'}
+    )
+
+
+@metrics('median_items_region_freeship')
+def median_items_region_freeship_metrics(aggs):
+    region_medians = aggs['median_items_sold_region_freeship'].groupby('region')['itemssold'].median()
+    return dbc.Row([
+        metric_card("Region with Highest Median Sales", f"{region_medians.idxmax()}",
+                    f"Median Items Sold: {region_medians.max():.1f}", color="primary"),
+        metric_card("Region with Lowest Median Sales", f"{region_medians.idxmin()}",
+                    f"Median Items Sold: {region_medians.min():.1f}", color="info"),
+    ])
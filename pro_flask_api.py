@@ -1,13 +1,279 @@
-from flask import Flask, jsonify, request
+from collections import OrderedDict
+from flask import Flask, Response, jsonify, request, stream_with_context
+import hashlib
+import io
+import threading
+import time
 import pandas as pd
+import pyarrow as pa
+import metrics
+import online_store
+import query_index
+import schema
+import storage
 
 app = Flask(__name__)
+metrics.instrument_flask(app)  # request counters and /metrics
+
+# Response formats of /data, selected with ?format= or the Accept header
+FORMATS = {
+    'json': "application/json",
+    'ndjson': "application/x-ndjson",
+    'arrow': "application/vnd.apache.arrow.stream",
+    'feather': "application/vnd.apache.arrow.file",
+}
+STREAM_CHUNK_ROWS = 50_000  # rows serialized at a time by the streaming formats
+
+# Parsed, indexed store and serialized /data bodies, kept until the store manifest changes;
+# past MAX_CACHED_BODIES the least recently used body is dropped
+MAX_CACHED_BODIES = 32
+_cache = {'token': None, 'index': None, 'bodies': OrderedDict()}
+_cache_lock = threading.Lock()
+
+# Online store lookups for /features; caught up with the store when its manifest changes
+MAX_LOOKUP_BATCH = 10_000
+_online = {'token': None, 'store': None}
+
+def load_store():
+    """Return the cache entry for the current store, re-reading it only when it changed."""
+    storage.ensure_store()
+    token = storage.store_token()
+    with _cache_lock:
+        if _cache['token'] != token:
+            with metrics.timed('api_index') as timer:
+                index = query_index.build_index(storage.read_store())
+                timer.rows, timer.bytes = len(index['df']), schema.memory_bytes(index['df'])
+            _cache.update(token=token, index=index, bodies=OrderedDict())
+        return dict(_cache)
+
+def load_online_store():
+    """Return the online store reader, rebuilding the online store first if it is behind the store."""
+    storage.ensure_store()
+    token = storage.store_token()
+    with _cache_lock:
+        if _online['token'] != token:
+            online_store.ensure_current()  # a no-op when Fetch_data already applied the append
+            _online.update(token=token, store=_online['store'] or online_store.OnlineStore())
+        return _online['store']
+
+def make_etag(token, query):
+    """ETag for one representation of one version of the store."""
+    key = "|".join([token or "", repr(query)])
+    return hashlib.md5(key.encode()).hexdigest()
+
+def get_list_arg(name):
+    """Values of a list parameter given either repeated (?region=a&region=b) or comma separated."""
+    values = []
+    for raw in request.args.getlist(name):
+        values.extend(v.strip() for v in raw.split(",") if v.strip())
+    return tuple(values)
+
+def negotiate_format():
+    """Pick the response format from ?format= or, failing that, the Accept header."""
+    name = request.args.get("format")
+    if name is not None:
+        if name not in FORMATS:
+            raise ValueError(f"Unknown format: {name} (expected one of {', '.join(FORMATS)})")
+        return name
+    best = request.accept_mimetypes.best_match(list(FORMATS.values()), default=FORMATS['json'])
+    return next(name for name, mimetype in FORMATS.items() if mimetype == best)
+
+def parse_date(value):
+    """value as an ISO date; raises ValueError if it is not a date (empty values included)."""
+    timestamp = pd.Timestamp(value)
+    if pd.isna(timestamp):
+        raise ValueError(f"Not a date: {value!r}")
+    return timestamp.date().isoformat()
+
+def get_date_arg(name):
+    """A date query parameter as an ISO date, or None if absent."""
+    value = request.args.get(name)
+    return None if value is None else parse_date(value)
+
+def parse_query():
+    """Normalize the /data query parameters; raises ValueError on bad input."""
+    limit = request.args.get("limit")
+    if limit is not None:
+        limit = int(limit)
+        if limit <= 0:
+            raise ValueError("limit must be a positive integer")
+    cursor = request.args.get("cursor")
+    updated_after = request.args.get("updated_after")
+    if updated_after is not None:
+        updated_after = pd.Timestamp(updated_after)
+        if pd.isna(updated_after):
+            raise ValueError(f"Not a timestamp: {request.args['updated_after']!r}")
+    return {
+        'start': get_date_arg("start"),
+        'end': get_date_arg("end"),
+        'regions': get_list_arg("region"),
+        'productids': tuple(int(p) for p in get_list_arg("productid")),
+        'columns': get_list_arg("columns"),
+        'after': query_index.decode_cursor(cursor) if cursor else None,
+        'limit': limit,
+        'updated_after': updated_after,
+        'format': negotiate_format(),
+    }
+
+def iter_chunks(df, positions):
+    """Slices of df at positions, STREAM_CHUNK_ROWS rows at a time."""
+    for i in range(0, len(positions), STREAM_CHUNK_ROWS):
+        yield df.take(positions[i:i + STREAM_CHUNK_ROWS])
+
+def stream_ndjson(df, positions):
+    """One JSON object per line, serialized chunk by chunk."""
+    for chunk in iter_chunks(df, positions):
+        lines = schema.to_wire(chunk).to_json(orient="records", lines=True)
+        yield lines if lines.endswith("\n") else lines + "\n"
+
+def arrow_table(df):
+    """df as an Arrow table with the canonical ARROW_TYPES, the same types as the Parquet files."""
+    return schema.cast_table(pa.Table.from_pandas(df, preserve_index=False))
+
+def stream_arrow(df, positions):
+    """Arrow IPC stream: the schema followed by one record batch per chunk."""
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, arrow_table(df.iloc[:0]).schema) as writer:
+        for chunk in iter_chunks(df, positions):
+            writer.write_table(arrow_table(chunk))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()  # end-of-stream marker
+
+def build_feather(df, positions):
+    """Arrow IPC file (Feather v2); the footer needs the whole table, so this one is not streamed."""
+    sink = pa.BufferOutputStream()
+    table = arrow_table(df.take(positions))
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=STREAM_CHUNK_ROWS)
+    return sink.getvalue().to_pybytes()
 
 @app.route("/data", methods=["GET"])
 def get_data():
-    df = pd.read_csv(r"D:\MSBA\Courses\Fall_2024\BZAN545\Assignments\Group_ASS\final_project\data_sets\feature_store.csv")
-    result = df.to_dict(orient="records")
-    return jsonify(result)
+    """Feature store rows, optionally filtered by salesdate range, region, productid and update time,
+    projected to a subset of columns, paginated with limit/cursor and returned as
+    JSON, streamed NDJSON (both in the upstream text formats), a streamed Arrow IPC
+    stream or a Feather file (both with the canonical schema types)."""
+    try:
+        query = parse_query()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    cache = load_store()
+    index = cache['index']
+    unknown = [c for c in query['columns'] if c not in index['df'].columns]
+    if unknown:
+        return jsonify({"error": f"Unknown columns: {', '.join(unknown)}"}), 400
+
+    query_key = tuple(sorted(query.items()))
+    etag = make_etag(cache['token'], query_key)
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+    with _cache_lock:
+        cached = cache['bodies'].get(query_key)
+        if cached is not None:
+            cache['bodies'].move_to_end(query_key)
+    if cached is None:
+        positions, has_more = query_index.select_rows(
+            index, query['start'], query['end'], query['regions'], query['productids'],
+            query['after'], query['limit'], query['updated_after']
+        )
+        df = index['df']
+        if query['columns']:
+            df = df[list(query['columns'])]
+        next_cursor = query_index.encode_cursor(index, positions[-1]) if has_more else None
+
+        if query['format'] in ('ndjson', 'arrow'):
+            stream = stream_ndjson if query['format'] == 'ndjson' else stream_arrow
+            # Times the serialization only, not the time spent writing chunks to the client
+            body = stream_with_context(metrics.timed_iter(
+                'api_serialize', stream(df, positions), count=lambda chunk: (0, len(chunk)),
+                rows=len(positions), format=query['format']
+            ))
+        else:
+            with metrics.timed('api_serialize', format=query['format']) as timer:
+                if query['format'] == 'feather':
+                    body = build_feather(df, positions)
+                else:
+                    body = app.json.dumps(schema.to_wire(df.take(positions)).to_dict(orient="records"))
+                timer.rows, timer.bytes = len(positions), len(body)
+            cached = (body, next_cursor)
+            with _cache_lock:
+                if _cache['token'] == cache['token']:
+                    _cache['bodies'][query_key] = cached
+                    if len(_cache['bodies']) > MAX_CACHED_BODIES:
+                        _cache['bodies'].popitem(last=False)
+    else:
+        body, next_cursor = cached
+
+    response = Response(body, mimetype=FORMATS[query['format']])
+    response.set_etag(etag)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+def parse_entity(entity, as_of):
+    """(productid, region, as_of) of one entity of a batch lookup; raises ValueError on bad input."""
+    if not isinstance(entity, dict) or 'productid' not in entity or 'region' not in entity:
+        raise ValueError("Every entity needs a productid and a region")
+    entity_as_of = entity.get('as_of')
+    return int(entity['productid']), str(entity['region']), as_of if entity_as_of is None else parse_date(entity_as_of)
+
+@app.route("/features", methods=["GET"])
+def get_features():
+    """Feature vector of one (productid, region) entity from the online store: its latest salesdate,
+    or the latest one at or before ?as_of=."""
+    try:
+        if "productid" not in request.args or "region" not in request.args:
+            raise ValueError("productid and region are required")
+        productid, region = int(request.args["productid"]), request.args["region"]
+        as_of = get_date_arg("as_of")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    store = load_online_store()
+    start = time.perf_counter()
+    vector = store.get(productid, region, as_of)
+    metrics.observe('online_lookup_seconds', time.perf_counter() - start,
+                    buckets=online_store.LATENCY_BUCKETS, kind='single')
+    if vector is None:
+        return jsonify({"error": f"No features for productid {productid} in region {region}"}), 404
+    return jsonify(vector)
+
+@app.route("/features", methods=["POST"])
+def get_features_batch():
+    """Feature vectors of many entities in one request. The JSON body is
+    {"entities": [{"productid": 180, "region": "e", "as_of": "2024-11-01"}, ...], "as_of": ...};
+    as_of is optional at both levels (absent or null means the latest; anything else must be a date).
+    Answers {"features": [...]} in entity order, null where none."""
+    body = request.get_json(silent=True)
+    try:
+        if not isinstance(body, dict) or not isinstance(body.get('entities'), list):
+            raise ValueError('Expected a JSON object with an "entities" list')
+        if len(body['entities']) > MAX_LOOKUP_BATCH:
+            raise ValueError(f"At most {MAX_LOOKUP_BATCH} entities per request")
+        as_of = None if body.get('as_of') is None else parse_date(body['as_of'])
+        entities = [parse_entity(entity, as_of) for entity in body['entities']]
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    store = load_online_store()
+    start = time.perf_counter()
+    vectors = store.get_many(entities)
+    metrics.observe('online_lookup_seconds', time.perf_counter() - start,
+                    buckets=online_store.LATENCY_BUCKETS, kind='batch')
+    return jsonify({"features": vectors})
+
+@app.route("/health", methods=["GET"])
+def health():
+    """Cheap readiness check: answers without reading or indexing the store."""
+    return jsonify({
+        'status': 'ok',
+        'store_token': storage.store_token(),
+        'cached_token': _cache['token'],
+    })
 
 if __name__ == "__main__":
-    app.run(port=5000)
\ No newline at end of file
+    app.run(port=5000)
@@ -0,0 +1,112 @@
+import base64
+import json
+
+import numpy as np
+import pandas as pd
+
+import schema
+
+
+def build_index(df):
+    """Sort the store by (salesdate, productid, region) and build the lookup arrays for /data queries.
+
+    df has the canonical schema types (see schema.py), so nothing is parsed here.
+    """
+    df = (schema.to_canonical(df)
+            .sort_values(['salesdate', 'productid', 'region'], kind='stable')
+            .reset_index(drop=True))
+    update_times = df['update_time'].fillna(pd.Timestamp.min).to_numpy(dtype='datetime64[ns]')
+    return {
+        'df': df,
+        'dates': df['salesdate'].to_numpy(dtype='datetime64[D]'),
+        'productids': df['productid'].to_numpy(dtype='int64'),
+        'regions': df['region'].astype(str).to_numpy(dtype='U'),
+        # Row positions (ascending) for every region and productid value
+        'region_rows': df.groupby('region', observed=True).indices,
+        'product_rows': df.groupby('productid').indices,
+        # Row positions ordered by update_time (unparseable ones sort first)
+        'update_times': np.sort(update_times),
+        'update_order': np.argsort(update_times, kind='stable'),
+    }
+
+
+def _key_range(index, key):
+    """Positions [first, last) of the rows whose (salesdate, productid, region) equals key."""
+    date, productid, region = key
+    date = np.datetime64(date, 'D')
+    lo = np.searchsorted(index['dates'], date, side='left')
+    hi = np.searchsorted(index['dates'], date, side='right')
+    products = index['productids'][lo:hi]
+    first = lo + np.searchsorted(products, productid, side='left')
+    last = lo + np.searchsorted(products, productid, side='right')
+    regions = index['regions'][first:last]
+    return first + np.searchsorted(regions, region, side='left'), first + np.searchsorted(regions, region, side='right')
+
+
+def encode_cursor(index, position):
+    """Opaque cursor pointing just after the row at position."""
+    key = (str(index['dates'][position]), int(index['productids'][position]), str(index['regions'][position]))
+    # The key is not unique in older data, so also record which of the equal keys this row is
+    duplicate = int(position - _key_range(index, key)[0])
+    return base64.urlsafe_b64encode(json.dumps([*key, duplicate]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor."""
+    try:
+        date, productid, region, duplicate = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(date), int(productid), str(region), int(duplicate)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def position_after(index, cursor):
+    """First row position that sorts after the row a decoded cursor points at."""
+    first, last = _key_range(index, cursor[:3])
+    return min(first + cursor[3] + 1, last) if first < last else first
+
+
+def _lookup(rows_by_value, values, lo, hi):
+    """Positions in [lo, hi) of the rows matching any of values."""
+    hits = []
+    for value in values:
+        rows = rows_by_value.get(value)
+        if rows is not None:
+            hits.append(rows[np.searchsorted(rows, lo):np.searchsorted(rows, hi)])
+    if not hits:
+        return np.empty(0, dtype=np.intp)
+    return np.unique(np.concatenate(hits))
+
+
+def _updated_since(index, updated_after, lo, hi):
+    """Positions in [lo, hi) of the rows with update_time at or after updated_after."""
+    first = np.searchsorted(index['update_times'], np.datetime64(updated_after, 'ns'), side='left')
+    rows = np.sort(index['update_order'][first:])
+    return rows[np.searchsorted(rows, lo):np.searchsorted(rows, hi)]
+
+
+def select_rows(index, start=None, end=None, regions=None, productids=None, after=None, limit=None,
+                updated_after=None):
+    """Positions of the rows matching the filters, in key order, plus whether more rows remain."""
+    dates = index['dates']
+    lo = np.searchsorted(dates, np.datetime64(start, 'D'), side='left') if start else 0
+    hi = np.searchsorted(dates, np.datetime64(end, 'D'), side='right') if end else len(dates)
+    if after is not None:
+        lo = max(lo, position_after(index, after))
+
+    positions = None
+    if regions:
+        positions = _lookup(index['region_rows'], regions, lo, hi)
+    if productids:
+        found = _lookup(index['product_rows'], productids, lo, hi)
+        positions = found if positions is None else np.intersect1d(positions, found, assume_unique=True)
+    if updated_after is not None:
+        found = _updated_since(index, updated_after, lo, hi)
+        positions = found if positions is None else np.intersect1d(positions, found, assume_unique=True)
+    if positions is None:
+        positions = np.arange(lo, max(lo, hi))
+
+    has_more = limit is not None and len(positions) > limit
+    if has_more:
+        positions = positions[:limit]
+    return positions, has_more
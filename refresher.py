@@ -0,0 +1,115 @@
+import logging
+import os
+import pickle
+import threading
+import time
+from datetime import datetime
+
+
+class AggregateRefresher:
+    """Keeps a snapshot of precomputed dashboard data current without blocking requests.
+
+    A background thread polls a cheap watermark every interval seconds and only
+    when it changes calls load(previous) to recompute the data, then swaps the new
+    snapshot in with a single reference assignment. Readers always see either
+    the old or the new snapshot, never a partly updated one. previous is the
+    (watermark, data) being replaced, so load can update it instead of starting
+    over; it is None on the first load and on forced refreshes.
+
+    With a snapshot_path, every new snapshot is also pickled to that file and a
+    restarted process serves it right away while the first refresh runs.
+    """
+
+    def __init__(self, load, watermark, interval=60, snapshot_path=None):
+        self.load = load
+        self.watermark = watermark
+        self.interval = interval
+        self.snapshot_path = snapshot_path
+        self._snapshot = None  # (watermark, data, refreshed_at)
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def snapshot(self):
+        """(watermark, data) of the latest snapshot, loading it synchronously if nothing has been loaded yet."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.refresh()
+            snapshot = self._snapshot
+        return snapshot[0], snapshot[1]
+
+    def current(self):
+        """The latest data."""
+        return self.snapshot()[1]
+
+    @property
+    def version(self):
+        snapshot = self._snapshot
+        return None if snapshot is None else snapshot[0]
+
+    @property
+    def last_refresh(self):
+        snapshot = self._snapshot
+        return None if snapshot is None else snapshot[2]
+
+    def refresh(self, force=False):
+        """Reload the data if the watermark moved (or force); returns True if a new snapshot was swapped in."""
+        with self._refresh_lock:
+            watermark = self.watermark()
+            if not force and self._snapshot is not None and watermark == self._snapshot[0]:
+                return False
+            start = time.perf_counter()
+            previous = None if force or self._snapshot is None else self._snapshot[:2]
+            data = self.load(previous)
+            self._snapshot = (watermark, data, datetime.now())
+            logging.info(f"Dashboard data refreshed to {watermark} in {time.perf_counter() - start:.2f}s")
+            self._save_snapshot_file()
+            return True
+
+    def load_snapshot_file(self):
+        """Serve the snapshot saved by an earlier process, if any; returns True if one was loaded."""
+        if not self.snapshot_path or self._snapshot is not None:
+            return False
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable dashboard snapshot {self.snapshot_path}: {e}")
+            return False
+        self._snapshot = snapshot
+        logging.info(f"Dashboard data loaded from snapshot {self.snapshot_path} ({snapshot[0]})")
+        return True
+
+    def _save_snapshot_file(self):
+        if not self.snapshot_path:
+            return
+        tmp_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(self._snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            logging.warning(f"Could not write dashboard snapshot {self.snapshot_path}: {e}")
+
+    def _run(self):
+        # Refresh right away: the current snapshot may be missing or come from a snapshot file
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                # Keep serving the previous snapshot; the next tick retries
+                logging.error(f"Dashboard refresh failed: {e}")
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self):
+        """Start the background refresh thread (idempotent)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="aggregate-refresher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,102 @@
+import numpy as np
+
+
+class RegressionAccumulator:
+    """Running statistics for a simple least-squares fit of y on x.
+
+    Keeps n, the means of x and y and the centred sums of squares and
+    cross-products, updated Welford-style (batches are combined with Chan's
+    formulas). Points can be added, or removed when a day is revised, without
+    revisiting earlier ones, and unlike raw sums (n*sum(x^2) - sum(x)^2) the
+    centred sums do not cancel out on large n. Slope, intercept, R and R^2 come
+    out in constant time.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.sxx = 0.0  # sum((x - mean_x)^2)
+        self.syy = 0.0  # sum((y - mean_y)^2)
+        self.sxy = 0.0  # sum((x - mean_x) * (y - mean_y))
+
+    @classmethod
+    def from_arrays(cls, x, y):
+        acc = cls()
+        acc.add(x, y)
+        return acc
+
+    def copy(self):
+        acc = RegressionAccumulator()
+        acc.__dict__.update(self.__dict__)
+        return acc
+
+    def _update(self, x, y, sign):
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        y = np.atleast_1d(np.asarray(y, dtype=float))
+        keep = ~(np.isnan(x) | np.isnan(y))  # like OLS with missing='drop'
+        x, y = x[keep], y[keep]
+        if not len(x):
+            return
+        # Centred statistics of the batch itself
+        m = len(x)
+        mean_x, mean_y = x.mean(), y.mean()
+        dx, dy = x - mean_x, y - mean_y
+        sxx, syy, sxy = (dx * dx).sum(), (dy * dy).sum(), (dx * dy).sum()
+
+        if sign > 0:
+            n = self.n + m
+            fx, fy = mean_x - self.mean_x, mean_y - self.mean_y
+            weight = self.n * m / n
+            self.mean_x += fx * m / n
+            self.mean_y += fy * m / n
+            self.sxx += sxx + fx * fx * weight
+            self.syy += syy + fy * fy * weight
+            self.sxy += sxy + fx * fy * weight
+            self.n = n
+            return
+
+        n = self.n - m
+        if n < 0:
+            raise ValueError(f"Cannot remove {m} points from a fit of {self.n}")
+        if n == 0:
+            self.__init__()
+            return
+        # Means of the points that remain, then the batch's share of the centred sums
+        rest_x = (self.n * self.mean_x - m * mean_x) / n
+        rest_y = (self.n * self.mean_y - m * mean_y) / n
+        fx, fy = mean_x - rest_x, mean_y - rest_y
+        weight = n * m / self.n
+        self.sxx = max(self.sxx - sxx - fx * fx * weight, 0.0)
+        self.syy = max(self.syy - syy - fy * fy * weight, 0.0)
+        self.sxy -= sxy + fx * fy * weight
+        self.n, self.mean_x, self.mean_y = n, rest_x, rest_y
+
+    def add(self, x, y):
+        """Add one point or arrays of points."""
+        self._update(x, y, 1)
+
+    def remove(self, x, y):
+        """Remove points added earlier, e.g. the old totals of a day that was revised."""
+        self._update(x, y, -1)
+
+    @property
+    def slope(self):
+        return self.sxy / self.sxx if self.n > 1 and self.sxx > 0 else np.nan
+
+    @property
+    def intercept(self):
+        return self.mean_y - self.slope * self.mean_x if self.n else np.nan
+
+    @property
+    def r(self):
+        """Pearson correlation, keeping the sign of the slope."""
+        denominator = np.sqrt(self.sxx * self.syy) if self.n > 1 else 0.0
+        return self.sxy / denominator if denominator > 0 else np.nan
+
+    @property
+    def r_squared(self):
+        return self.r ** 2
+
+    def predict(self, x):
+        return self.intercept + self.slope * np.asarray(x, dtype=float)
@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+
+import db
+
+# Pre-aggregated tables maintained by insert_to_sql and read by the dashboards.
+# Daily totals grow with the number of days; the weekday tables are bounded by
+# 7 weekdays x regions x freeship (x distinct itemssold values for the histogram).
+CREATE_ROLLUPS_SQL = """
+CREATE TABLE IF NOT EXISTS feature_store_daily_rollup (
+    salesdate DATE,
+    region text,
+    freeship BOOLEAN,
+    row_count BIGINT NOT NULL,
+    items_sold BIGINT NOT NULL,
+    discount_sum DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (salesdate, region, freeship)
+);
+CREATE TABLE IF NOT EXISTS feature_store_weekday_rollup (
+    weekday SMALLINT,
+    region text,
+    freeship BOOLEAN,
+    row_count BIGINT NOT NULL,
+    items_sold BIGINT NOT NULL,
+    discount_sum DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (weekday, region, freeship)
+);
+CREATE TABLE IF NOT EXISTS feature_store_items_histogram (
+    weekday SMALLINT,
+    region text,
+    freeship BOOLEAN,
+    itemssold INT,
+    row_count BIGINT NOT NULL,
+    PRIMARY KEY (weekday, region, freeship, itemssold)
+);
+"""
+
+ROLLUP_TABLES = ['feature_store_daily_rollup', 'feature_store_weekday_rollup', 'feature_store_items_histogram']
+
+# Signed rows to fold into the rollups: -1 for the current version of a row, +1 for the new one
+DELTA_COLUMNS_SQL = """
+    {table}.salesdate,
+    EXTRACT(ISODOW FROM {table}.salesdate)::smallint AS weekday,
+    COALESCE({table}.region, '') AS region,
+    COALESCE({table}.freeship, false) AS freeship,
+    COALESCE({table}.discount, 0) AS discount,
+    COALESCE({table}.itemssold, 0) AS itemssold
+"""
+
+APPLY_DELTA_SQL = """
+INSERT INTO feature_store_daily_rollup AS r (salesdate, region, freeship, row_count, items_sold, discount_sum)
+SELECT salesdate, region, freeship, sum(sign), sum(sign * itemssold), sum(sign * discount)
+FROM feature_store_delta GROUP BY salesdate, region, freeship
+ON CONFLICT (salesdate, region, freeship) DO UPDATE
+SET row_count = r.row_count + EXCLUDED.row_count,
+    items_sold = r.items_sold + EXCLUDED.items_sold,
+    discount_sum = r.discount_sum + EXCLUDED.discount_sum;
+
+INSERT INTO feature_store_weekday_rollup AS r (weekday, region, freeship, row_count, items_sold, discount_sum)
+SELECT weekday, region, freeship, sum(sign), sum(sign * itemssold), sum(sign * discount)
+FROM feature_store_delta GROUP BY weekday, region, freeship
+ON CONFLICT (weekday, region, freeship) DO UPDATE
+SET row_count = r.row_count + EXCLUDED.row_count,
+    items_sold = r.items_sold + EXCLUDED.items_sold,
+    discount_sum = r.discount_sum + EXCLUDED.discount_sum;
+
+INSERT INTO feature_store_items_histogram AS r (weekday, region, freeship, itemssold, row_count)
+SELECT weekday, region, freeship, itemssold, sum(sign)
+FROM feature_store_delta GROUP BY weekday, region, freeship, itemssold
+ON CONFLICT (weekday, region, freeship, itemssold) DO UPDATE
+SET row_count = r.row_count + EXCLUDED.row_count;
+
+DELETE FROM feature_store_daily_rollup WHERE row_count = 0;
+DELETE FROM feature_store_weekday_rollup WHERE row_count = 0;
+DELETE FROM feature_store_items_histogram WHERE row_count = 0;
+"""
+
+
+def create_tables(cur):
+    """Create the rollup tables; returns True if any of them did not exist yet."""
+    cur.execute("SELECT " + ", ".join(f"to_regclass('{t}') IS NULL" for t in ROLLUP_TABLES))
+    missing = any(cur.fetchone())
+    cur.execute(CREATE_ROLLUPS_SQL)
+    return missing
+
+
+def reset(cur):
+    """Empty the rollups (the fact table was just recreated)."""
+    create_tables(cur)
+    cur.execute(f"TRUNCATE {', '.join(ROLLUP_TABLES)}")
+
+
+def _apply_delta(cur, delta_sql):
+    cur.execute("DROP TABLE IF EXISTS feature_store_delta")
+    cur.execute(f"CREATE TEMP TABLE feature_store_delta ON COMMIT DROP AS {delta_sql}")
+    cur.execute(APPLY_DELTA_SQL)
+
+
+def rebuild(cur):
+    """Recompute every rollup from the full feature_store table."""
+    reset(cur)
+    _apply_delta(cur, f"SELECT 1 AS sign, {DELTA_COLUMNS_SQL.format(table='f')} "
+                      "FROM feature_store f WHERE f.salesdate IS NOT NULL")
+
+
+def apply_batch(cur, batch_table):
+    """Fold a batch about to be upserted into the rollups.
+
+    Must run before the upsert: rows the batch replaces are subtracted using
+    their current values and the batch rows are added, so the cost depends on
+    the batch size only.
+    """
+    _apply_delta(cur, f"""
+        SELECT -1 AS sign, {DELTA_COLUMNS_SQL.format(table='f')}
+        FROM feature_store f
+        JOIN {batch_table} b
+          ON f.salesdate = b.salesdate AND f.productid = b.productid AND f.region = b.region
+        UNION ALL
+        SELECT 1 AS sign, {DELTA_COLUMNS_SQL.format(table='b')}
+        FROM {batch_table} b WHERE b.salesdate IS NOT NULL
+    """)
+
+
+# Reading side, used by the dashboards
+
+WEEKDAYS_ORDER = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+BOX_MAX_OUTLIERS = 50  # outlier points drawn per box
+
+
+def data_watermark():
+    """(high-water mark, last sync time) of feature_store; moves whenever the loader commits new data."""
+    with db.get_engine().connect() as conn:
+        row = conn.exec_driver_sql(
+            "SELECT high_water_mark, synced_at FROM feature_store_sync_state WHERE table_name = 'feature_store'"
+        ).first()
+    return tuple(row) if row else None
+
+
+def load_rollups():
+    """Read the (small) rollup tables, with ISO weekday numbers mapped to weekday names."""
+    rollups = {
+        'daily': db.read_sql("SELECT * FROM feature_store_daily_rollup"),
+        'weekday': db.read_sql("SELECT * FROM feature_store_weekday_rollup"),
+        'histogram': db.read_sql("SELECT * FROM feature_store_items_histogram"),
+    }
+    rollups['daily']['salesdate'] = pd.to_datetime(rollups['daily']['salesdate'])
+    for name in ('weekday', 'histogram'):
+        frame = rollups[name]
+        frame['weekday_name'] = pd.Categorical(
+            frame['weekday'].map(lambda d: WEEKDAYS_ORDER[d - 1]),
+            categories=WEEKDAYS_ORDER,
+            ordered=True
+        )
+    return rollups
+
+
+def histogram_quantile(values, counts, q):
+    """Quantile of the data described by (value, count) pairs, interpolated like pandas' quantile."""
+    order = np.argsort(values, kind='stable')
+    values = np.asarray(values, dtype=float)[order]
+    cumulative = np.cumsum(np.asarray(counts)[order])
+    n = cumulative[-1] if len(cumulative) else 0
+    if n == 0:
+        return np.nan
+    position = q * (n - 1)
+    lower, upper = int(np.floor(position)), int(np.ceil(position))
+    lower_value = values[np.searchsorted(cumulative, lower, side='right')]
+    upper_value = values[np.searchsorted(cumulative, upper, side='right')]
+    return lower_value + (upper_value - lower_value) * (position - lower)
+
+
+def histogram_quantiles(histogram, by, q):
+    """Quantile q of itemssold for every group of the items histogram."""
+    return histogram.groupby(by, observed=True)[['itemssold', 'row_count']].apply(
+        lambda g: histogram_quantile(g['itemssold'].to_numpy(), g['row_count'].to_numpy(), q)
+    ).rename('itemssold')
+
+
+def box_stats(values, counts, max_outliers=BOX_MAX_OUTLIERS):
+    """Quartiles, Tukey whiskers, mean, count and a capped, evenly spaced sample of outliers."""
+    values = np.asarray(values, dtype=float)
+    counts = np.asarray(counts)
+    order = np.argsort(values, kind='stable')
+    values, counts = values[order], counts[order]
+    q1, median, q3 = (histogram_quantile(values, counts, q) for q in (0.25, 0.5, 0.75))
+    low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    inside = (values >= low) & (values <= high)
+
+    # Sample outliers by rank so the cost and the payload do not grow with the row count
+    outlier_values, outlier_counts = values[~inside], counts[~inside]
+    cumulative = np.cumsum(outlier_counts)
+    n_outliers = int(cumulative[-1]) if len(cumulative) else 0
+    ranks = np.unique(np.linspace(0, n_outliers - 1, min(n_outliers, max_outliers)).round().astype(int))
+    outliers = outlier_values[np.searchsorted(cumulative, ranks, side='right')]
+
+    return {
+        'q1': q1, 'median': median, 'q3': q3,
+        'lowerfence': values[inside].min(), 'upperfence': values[inside].max(),
+        'mean': float((values * counts).sum() / counts.sum()),
+        'count': int(counts.sum()),
+        'outliers': outliers.tolist(),
+    }
+
+
+def histogram_box_stats(histogram, by, max_outliers=BOX_MAX_OUTLIERS):
+    """box_stats of itemssold for every group of the items histogram, one row per group."""
+    return histogram.groupby(by, observed=True)[['itemssold', 'row_count']].apply(
+        lambda g: pd.Series(box_stats(g['itemssold'].to_numpy(), g['row_count'].to_numpy(), max_outliers))
+    )
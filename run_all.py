@@ -1,74 +1,131 @@
-
 import subprocess
+import sys
 import time
 import requests
-import threading
 import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
-os.chdir(r"D:\MSBA\Courses\Fall_2024\BZAN545\Assignments\Group_ASS\final_project\python_code")
+os.chdir(os.getenv('PIPELINE_DIR', r"D:\MSBA\Courses\Fall_2024\BZAN545\Assignments\Group_ASS\final_project\python_code"))
 os.getcwd()
 
-def run_script(script_name, step_description, wait_time=1):
-  
-    print(f"Step: {step_description} - Starting...")
-    
-    # Wait before starting the script
-    time.sleep(wait_time)  # Wait before running the script
-    
+API_HEALTH_URL = 'http://127.0.0.1:5000/health'
+DASHBOARD_HEALTH_URL = 'http://127.0.0.1:8051/health'
+SERVICE_START_TIMEOUT = float(os.getenv('SERVICE_START_TIMEOUT_SECONDS', 120))
+
+# Long-running services started by the pipeline, stopped when it ends
+services = []
+
+def run_script(script_name):
+    """Run a script to completion; raises if it fails."""
+    print(f"Running {script_name}...")
     try:
-        print(f"Running {script_name}...")
-        result = subprocess.run(['python', script_name], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        print(f"{script_name} executed successfully.")
-        print(result.stdout.decode())  
+        result = subprocess.run([sys.executable, script_name], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     except subprocess.CalledProcessError as e:
-        print(f"Error occurred while running {script_name}: {e.stderr.decode()}")
-        exit(1)  
-    
-    # Wait after the script completes
-    print(f"Step: {step_description} - Completed.\n")
-    time.sleep(5)  # Wait after running the script
-
-def run_flask_in_thread(script_name):
-    """Run Flask API in a separate thread and wait until it's accessible."""
-    def target():
-        subprocess.run(['python', script_name])
-
-    print("Step: Running Flask API in the background...")
-    thread = threading.Thread(target=target)
-    thread.daemon = True  # Ensure the thread exits when the main program exits
-    thread.start()
-
-    # Check if the API is accessible
-    for _ in range(10):  # Retry 10 times (adjust as needed)
+        raise RuntimeError(f"{script_name} failed: {e.stderr.decode()}") from e
+    print(f"{script_name} executed successfully.")
+    print(result.stdout.decode())
+
+def start_service(script_name, health_url, timeout=SERVICE_START_TIMEOUT):
+    """Start a server script in the background and return once its health endpoint answers."""
+    process = subprocess.Popen([sys.executable, script_name])
+    services.append(process)
+
+    # Poll quickly at first, then back off to at most one check per second
+    deadline = time.monotonic() + timeout
+    delay = 0.05
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{script_name} exited with code {process.returncode} before becoming ready")
         try:
-            response = requests.get('http://127.0.0.1:5000/data')  # Test endpoint
-            if response.status_code == 200:
-                print("Flask API is up and running!")
-                return thread
-        except requests.ConnectionError:
-            time.sleep(8)  # Wait 2 seconds before retrying
+            if requests.get(health_url, timeout=1).status_code == 200:
+                print(f"{script_name} is up and running!")
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+    raise RuntimeError(f"{script_name} did not answer {health_url} within {timeout:.0f}s")
+
+# Pipeline stages: what each one runs and which stages it waits for
+STAGES = {
+    'fetch': {'run': lambda: run_script('Fetch_data.py'), 'deps': []},
+    'api': {'run': lambda: start_service('pro_flask_api.py', API_HEALTH_URL), 'deps': []},
+    # The loader reads the store files directly unless SYNC_SOURCE=api
+    'sql': {'run': lambda: run_script('insert_to_sql.py'),
+            'deps': ['fetch', 'api'] if os.getenv('SYNC_SOURCE', 'store') == 'api' else ['fetch']},
+    'dashboard': {'run': lambda: start_service('dashboard.py', DASHBOARD_HEALTH_URL), 'deps': ['sql']},
+}
+
+def run_dag(stages):
+    """Run every stage as soon as all of its dependencies have succeeded, independent stages in parallel.
 
-    print("Failed to connect to the Flask API.")
-    exit(1)
+    Returns {stage: {'status', 'start', 'seconds', 'error'}} with start offsets
+    relative to the beginning of the run. Stages downstream of a failure are skipped.
+    """
+    report = {}
+    started = time.perf_counter()
+    pending = dict(stages)
+    running = {}
+
+    def timed(name):
+        start = time.perf_counter()
+        report[name] = {'status': 'running', 'start': start - started, 'seconds': None, 'error': None}
+        try:
+            stages[name]['run']()
+            report[name]['status'] = 'ok'
+        except Exception as e:
+            report[name].update(status='failed', error=str(e))
+        report[name]['seconds'] = time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=len(stages)) as executor:
+        while pending or running:
+            # Skip stages whose dependencies failed, start those whose dependencies all succeeded
+            for name, stage in list(pending.items()):
+                statuses = [report.get(dep, {}).get('status') for dep in stage['deps']]
+                if any(status in ('failed', 'skipped') for status in statuses):
+                    report[name] = {'status': 'skipped', 'start': None, 'seconds': None, 'error': None}
+                    del pending[name]
+                elif all(status == 'ok' for status in statuses):
+                    running[executor.submit(timed, name)] = name
+                    del pending[name]
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+    for name in pending:
+        report[name] = {'status': 'skipped', 'start': None, 'seconds': None, 'error': None}
+    return report
+
+def print_report(report, total):
+    print(f"\n{'stage':<12} {'status':<8} {'start':>8} {'seconds':>9}")
+    for name, r in report.items():
+        start = f"{r['start']:.2f}" if r['start'] is not None else "-"
+        seconds = f"{r['seconds']:.2f}" if r['seconds'] is not None else "-"
+        print(f"{name:<12} {r['status']:<8} {start:>8} {seconds:>9}")
+        if r['error']:
+            print(f"    {r['error'].strip()}")
+    print(f"{'total':<12} {'':<8} {'':>8} {total:>9.2f}\n")
 
 def automate_process():
-    """Automates the execution of fetch.py, api.py, sql.py, and dash.py in sequence."""
+    """Runs fetch, the Flask API, the SQL load and the dashboard, each as soon as its inputs are ready."""
     print("Starting the entire data pipeline process...\n")
+    start = time.perf_counter()
+    report = run_dag(STAGES)
+    print_report(report, time.perf_counter() - start)
 
-    # Fetching data from remote server
-    run_script('fetch_data.py', "Fetching data from the remote server...", wait_time=5)
-    
-    # Running the Flask API
-    flask_thread = run_flask_in_thread('pro_flask_api.py')  # Start Flask API in thread
-    time.sleep(10)  # Allow extra time for Flask to spin up
-
-    # Inserting data into SQL
-    run_script('insert_to_sql.py', "Inserting the fetched data into the SQL database...", wait_time=3)
-    
-    # Running the dashboard
-    run_script('dashboard.py', "Running the dashboard to visualize the data...", wait_time=1)
+    if any(r['status'] != 'ok' for r in report.values()):
+        for process in services:
+            process.terminate()
+        exit(1)
 
     print("Automation process completed successfully. All steps are done!")
+    # Keep the API and dashboard running until the dashboard is closed
+    try:
+        services[-1].wait()
+    finally:
+        for process in services:
+            process.terminate()
 
 if __name__ == "__main__":
     automate_process()
@@ -0,0 +1,258 @@
+import argparse
+import logging
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Canonical in-memory types of the feature store columns. Fetch_data, the Parquet
+# store, pro_flask_api, insert_to_sql and the dashboards all go through
+# to_canonical, so the text columns are parsed once, with explicit formats, where
+# rows enter the pipeline instead of being re-inferred by every reader.
+
+COLUMNS = ['salesdate', 'productid', 'region', 'freeship', 'discount', 'itemssold', 'update_time']
+
+DTYPES = {
+    'salesdate': 'datetime64[ns]',
+    'productid': 'int32',
+    'region': 'category',
+    'freeship': 'bool',
+    'discount': 'float32',
+    'itemssold': 'int32',
+    'update_time': 'datetime64[ns]',
+}
+
+# The same types in the Parquet files and Arrow responses
+ARROW_TYPES = {
+    'salesdate': pa.timestamp('ns'),
+    'productid': pa.int32(),
+    'region': pa.dictionary(pa.int32(), pa.string()),
+    'freeship': pa.bool_(),
+    'discount': pa.float32(),
+    'itemssold': pa.int32(),
+    'update_time': pa.timestamp('ns'),
+}
+
+# How the text files (feature_store.csv) are read before to_canonical: no type inference
+CSV_DTYPES = {
+    'salesdate': str,
+    'productid': 'int32',
+    'region': 'category',
+    'freeship': 'int8',
+    'discount': 'float32',
+    'itemssold': 'int32',
+    'update_time': str,
+}
+
+# Upstream salesdate values look like 9/11/2024
+SALESDATE_FORMAT = "%m/%d/%Y"
+# update_time as written by Fetch_data, then the older formats found in the store, tried in this order
+UPDATE_TIME_FORMAT = "%Y-%m-%d %I:%M %p"
+LEGACY_UPDATE_TIME_FORMATS = ("%m/%d/%Y %H:%M", "%m/%d/%Y")
+
+# Any decimal with FLT_DIG significant digits survives a float32 round trip, and FLT_DECIMAL_DIG
+# digits are always enough to tell two float32 values apart
+FLOAT32_DIGITS = 6
+FLOAT32_MAX_DIGITS = 9
+
+
+def parse_salesdate(values):
+    """salesdate values (text like 9/11/2024, dates or timestamps) as datetime64."""
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_dtype(values):
+        return values.astype('datetime64[ns]')
+    return pd.to_datetime(values, format=SALESDATE_FORMAT, cache=True)
+
+
+def parse_update_time(values):
+    """update_time values as datetime64, trying each known format in turn; unparseable values become NaT."""
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_dtype(values):
+        return values.astype('datetime64[ns]')
+    parsed = pd.to_datetime(values, format=UPDATE_TIME_FORMAT, errors='coerce', cache=True)
+    for date_format in LEGACY_UPDATE_TIME_FORMATS:
+        missing = parsed.isna() & values.notna()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(values[missing], format=date_format, errors='coerce', cache=True)
+    return parsed
+
+
+def _region(values):
+    # Categories in sorted order, so sorting by region sorts by name
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = values.cat.categories
+        if categories.is_monotonic_increasing:
+            return values
+        return values.cat.reorder_categories(categories.sort_values())
+    return values.astype('category')
+
+
+def _freeship(values):
+    # 1 becomes True, anything else (0, missing) False
+    return values if pd.api.types.is_bool_dtype(values) else values == 1
+
+
+CONVERTERS = {
+    'salesdate': parse_salesdate,
+    'productid': lambda values: values.astype('int32'),
+    'region': _region,
+    'freeship': _freeship,
+    'discount': lambda values: values.astype('float32'),
+    'itemssold': lambda values: values.astype('int32'),
+    'update_time': parse_update_time,
+}
+
+
+def to_canonical(df, table=None):
+    """df with its feature store columns converted to DTYPES (other columns are left alone).
+
+    Columns that already have their canonical type are not touched, so calling
+    it again is cheap. With table set, logs the memory saved under that name.
+    """
+    report = table is not None and logging.getLogger().isEnabledFor(logging.INFO)
+    before = memory_bytes(df) if report else None
+    converted = {}
+    for name, convert in CONVERTERS.items():
+        if name in df.columns:
+            column = df[name]
+            if name == 'region' or str(column.dtype) != DTYPES[name]:
+                converted[name] = convert(column)
+    if converted:
+        df = df.assign(**converted)
+    if report:
+        log_memory(table, len(df), before, memory_bytes(df))
+    return df
+
+
+def empty_frame(columns=None):
+    """A frame with no rows and the given feature store columns (all of them by default) in their canonical types."""
+    columns = columns or COLUMNS
+    return pd.DataFrame({name: pd.Series(dtype=DTYPES.get(name, 'object')) for name in columns})
+
+
+def format_salesdate(date):
+    """A date in the upstream salesdate format, without zero padding (9/11/2024)."""
+    return f"{date.month}/{date.day}/{date.year}"
+
+
+def _format_dates(values, format_value):
+    # Few distinct dates, so format each one once and broadcast
+    codes, uniques = pd.factorize(values)
+    formatted = np.array([format_value(value) for value in uniques] + [None], dtype=object)
+    return formatted[codes]  # code -1 (NaT) picks the trailing None
+
+
+def discount_as_float64(values):
+    """float32 discounts widened to float64 without float32 noise (1.622, not 1.6219999790191650).
+
+    Each value becomes the shortest decimal that reads back as the same float32,
+    like np.format_float_positional(value, unique=True), so no stored digit is lost.
+    """
+    values32 = np.asarray(values, dtype=np.float32)
+    values = values32.astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        magnitude = np.floor(np.log10(np.abs(values)))
+    magnitude = np.where(np.isfinite(magnitude), magnitude, 0)
+    result = values.copy()  # values no shorter decimal reproduces stay exact
+    pending = np.isfinite(values)
+    for digits in range(FLOAT32_DIGITS, FLOAT32_MAX_DIGITS + 1):
+        if not pending.any():
+            break
+        scale = 10.0 ** (digits - 1 - magnitude[pending])
+        candidate = np.round(values[pending] * scale) / scale
+        exact = candidate.astype(np.float32) == values32[pending]
+        positions = np.flatnonzero(pending)[exact]
+        result[positions] = candidate[exact]
+        pending[positions] = False
+    return result
+
+
+def to_wire(df):
+    """df in the text formats and plain types of the upstream data, for JSON output.
+
+    salesdate becomes 9/11/2024, update_time UPDATE_TIME_FORMAT, region a plain
+    string and freeship 0/1, as in the payloads Fetch_data reads.
+    """
+    converted = {}
+    if 'salesdate' in df.columns:
+        converted['salesdate'] = _format_dates(df['salesdate'], format_salesdate)
+    if 'update_time' in df.columns:
+        converted['update_time'] = _format_dates(df['update_time'], lambda t: t.strftime(UPDATE_TIME_FORMAT))
+    if 'region' in df.columns:
+        converted['region'] = df['region'].astype(object)
+    if 'discount' in df.columns:
+        converted['discount'] = discount_as_float64(df['discount'])
+    for name in ('productid', 'freeship', 'itemssold'):
+        if name in df.columns:
+            converted[name] = df[name].astype('int64')
+    return df.assign(**converted)
+
+
+def cast_table(table):
+    """An Arrow table with its feature store columns cast to ARROW_TYPES.
+
+    Parquet files written before this schema hold text dates, int64 and float64
+    columns; their dates are parsed with the same explicit formats as to_canonical.
+    """
+    for name, arrow_type in ARROW_TYPES.items():
+        i = table.schema.get_field_index(name)
+        if i < 0 or table.schema.field(i).type == arrow_type:
+            continue
+        column = table.column(i)
+        if pa.types.is_timestamp(arrow_type) and not pa.types.is_timestamp(column.type):
+            column = pa.array(CONVERTERS[name](column.to_pandas()), type=arrow_type)
+        else:
+            column = column.cast(arrow_type)
+        table = table.set_column(i, name, column)
+    return table
+
+
+def memory_bytes(df):
+    return int(df.memory_usage(index=False, deep=True).sum())
+
+
+def log_memory(table, rows, before, after):
+    saved = 1 - after / before if before else 0.0
+    logging.info(f"{table}: {rows} rows, {before / 2**20:.1f} MiB with default dtypes, "
+                 f"{after / 2**20:.1f} MiB canonical ({saved:.0%} less)")
+
+
+def memory_report(tables):
+    """(table, rows, bytes with default dtypes, bytes canonical) for each (name, DataFrame with default dtypes)."""
+    report = []
+    for name, df in tables:
+        report.append((name, len(df), memory_bytes(df), memory_bytes(to_canonical(df))))
+    return report
+
+
+def _default_tables(sources):
+    """The feature store tables as every reader used to load them, with pandas' default dtypes."""
+    import storage
+    if 'csv' in sources:
+        try:
+            yield 'feature_store.csv', pd.read_csv(storage.CSV_PATH)
+        except FileNotFoundError:
+            logging.warning(f"No {storage.CSV_PATH}")
+    if 'store' in sources:
+        # The store's rows in the upstream text formats, as they were stored and served before
+        yield 'feature_store/ (Parquet)', to_wire(storage.read_store())
+    if 'db' in sources:
+        import db
+        try:
+            yield 'feature_store (PostgreSQL)', db.read_large_sql(f"SELECT {', '.join(COLUMNS)} FROM feature_store")
+        except Exception as e:
+            logging.warning(f"Could not read feature_store from PostgreSQL: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the memory each feature store table takes "
+                                                 "with default dtypes and with the canonical schema.")
+    parser.add_argument("--tables", nargs="+", default=['csv', 'store', 'db'], choices=['csv', 'store', 'db'])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    print(f"{'table':<28} {'rows':>10} {'default MiB':>12} {'canonical MiB':>14} {'saved':>6}")
+    for name, rows, before, after in memory_report(_default_tables(args.tables)):
+        saved = 1 - after / before if before else 0.0
+        print(f"{name:<28} {rows:>10} {before / 2**20:>12.1f} {after / 2**20:>14.1f} {saved:>6.0%}")
@@ -0,0 +1,125 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+
+import aiohttp
+
+DEFAULT_SOURCE_URL = 'http://ballings.co/data.py'
+
+# Fetch settings; every source can override its timeout
+FETCH_CONCURRENCY = int(os.getenv('FETCH_CONCURRENCY', 4))       # sources downloaded at the same time
+FETCH_TIMEOUT = float(os.getenv('FETCH_TIMEOUT_SECONDS', 60))    # per request, per source
+FETCH_RETRIES = int(os.getenv('FETCH_RETRIES', 3))               # retries after the first attempt
+FETCH_BACKOFF = float(os.getenv('FETCH_BACKOFF_SECONDS', 1.0))   # base delay, doubled on every retry
+FETCH_BACKOFF_MAX = float(os.getenv('FETCH_BACKOFF_MAX_SECONDS', 30.0))
+
+# Server answers worth retrying; other non-200 statuses fail the source right away
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class RetryableStatus(Exception):
+    pass
+
+
+def load_sources():
+    """The configured upstream sources as dicts with name, url and timeout.
+
+    FEATURE_SOURCES_FILE points to a JSON list of URLs or {"name", "url", "timeout"}
+    objects; otherwise FEATURE_SOURCES is a comma-separated list of URLs.
+    """
+    path = os.getenv('FEATURE_SOURCES_FILE')
+    if path:
+        with open(path) as f:
+            entries = json.load(f)
+    else:
+        entries = [u.strip() for u in os.getenv('FEATURE_SOURCES', DEFAULT_SOURCE_URL).split(',') if u.strip()]
+
+    sources = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'url': entry}
+        sources.append({
+            'name': entry.get('name', entry['url']),
+            'url': entry['url'],
+            'timeout': float(entry.get('timeout', FETCH_TIMEOUT)),
+        })
+    return sources
+
+
+def backoff_delay(attempt, base=FETCH_BACKOFF, cap=FETCH_BACKOFF_MAX):
+    """Exponential backoff with full jitter: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def _fetch_once(session, source, source_state):
+    headers = {}
+    if source_state.get('etag'):
+        headers['If-None-Match'] = source_state['etag']
+    if source_state.get('last_modified'):
+        headers['If-Modified-Since'] = source_state['last_modified']
+
+    timeout = aiohttp.ClientTimeout(total=source['timeout'])
+    async with session.get(source['url'], headers=headers, timeout=timeout) as response:
+        if response.status == 304:
+            return {'status': 'unchanged', 'reason': "HTTP 304"}
+        if response.status in RETRY_STATUSES:
+            raise RetryableStatus(f"HTTP status code: {response.status}")
+        if response.status != 200:
+            raise ValueError(f"Failed to fetch data, HTTP status code: {response.status}")
+        content = await response.read()
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+    content_hash = hashlib.sha256(content).hexdigest()
+    if content_hash == source_state.get('content_hash'):
+        return {'status': 'unchanged', 'reason': "content hash unchanged"}
+    return {'status': 'changed', 'content': content, 'etag': etag,
+            'last_modified': last_modified, 'content_hash': content_hash}
+
+
+async def fetch_source(session, semaphore, source, source_state, retries=FETCH_RETRIES, backoff=FETCH_BACKOFF):
+    """Fetch one source, retrying connection errors, timeouts and retryable statuses with backoff.
+
+    Returns a dict with 'source', 'status' ('changed', 'unchanged' or 'failed'),
+    'attempts' and 'seconds', plus the content and validators when changed.
+    """
+    start = time.perf_counter()
+    for attempt in range(retries + 1):
+        try:
+            # Hold a slot only while requesting, so the timeout does not count time spent queued
+            async with semaphore:
+                result = await _fetch_once(session, source, source_state)
+            break
+        except (aiohttp.ClientError, asyncio.TimeoutError, RetryableStatus) as e:
+            error = (f"timed out after {source['timeout']:g}s" if isinstance(e, asyncio.TimeoutError)
+                     else f"{type(e).__name__}: {e}")
+            if attempt == retries:
+                result = {'status': 'failed', 'error': error}
+                break
+            delay = backoff_delay(attempt, backoff)
+            logging.warning(f"Fetching {source['name']} failed ({error}); retry {attempt + 1} of {retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        except Exception as e:
+            result = {'status': 'failed', 'error': f"{type(e).__name__}: {e}"}
+            break
+    result.update(source=source, attempts=attempt + 1, seconds=time.perf_counter() - start)
+    return result
+
+
+async def fetch_all(sources, state, concurrency=FETCH_CONCURRENCY, retries=FETCH_RETRIES, backoff=FETCH_BACKOFF):
+    """Fetch every source concurrently over one shared connection pool; results follow the order of sources."""
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        return await asyncio.gather(*(
+            fetch_source(session, semaphore, source, state.get(source['url'], {}), retries, backoff)
+            for source in sources
+        ))
+
+
+def fetch_sources(sources, state, **kwargs):
+    """Blocking wrapper around fetch_all for the synchronous updater."""
+    return asyncio.run(fetch_all(sources, state, **kwargs))
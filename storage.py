@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import schema
+
+# Directory holding the feature store; override with FEATURE_STORE_DIR
+DATA_DIR = os.getenv(
+    'FEATURE_STORE_DIR',
+    r"D:\MSBA\Courses\Fall_2024\BZAN545\Assignments\Group_ASS\final_project\data_sets"
+)
+CSV_PATH = os.path.join(DATA_DIR, "feature_store.csv")  # legacy single-file store
+STORE_DIR = os.path.join(DATA_DIR, "feature_store")      # partitioned Parquet store
+
+MANIFEST_NAME = "_manifest.json"
+
+
+def partition_dates(salesdate):
+    """Normalize salesdate values (e.g. 9/11/2024, or already parsed) to the ISO dates used to name partitions."""
+    return schema.parse_salesdate(salesdate).dt.strftime("%Y-%m-%d")
+
+
+def read_manifest(store_dir=STORE_DIR):
+    """Load the store manifest, or None if the store has not been created."""
+    manifest_path = os.path.join(store_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def _write_manifest(store_dir, manifest):
+    manifest_path = os.path.join(store_dir, MANIFEST_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, manifest_path)  # readers only ever see a complete manifest
+
+
+def store_token(store_dir=STORE_DIR):
+    """Cheap change token for the store (manifest mtime and size) that avoids parsing the manifest."""
+    manifest_path = os.path.join(store_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    stat = os.stat(manifest_path)
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+def store_version(store_dir=STORE_DIR):
+    """Monotonic version of the store, bumped by every append (0 if it does not exist)."""
+    manifest = read_manifest(store_dir)
+    return manifest['version'] if manifest else 0
+
+
+def append_rows(rows, store_dir=STORE_DIR):
+    """Write rows as new immutable Parquet files, one per salesdate partition, and publish them.
+
+    Rows are stored with the canonical schema types (see schema.py).
+    """
+    manifest = read_manifest(store_dir) or {'version': 0, 'columns': list(rows.columns), 'partitions': {}}
+    if rows.empty:
+        return manifest['version']
+
+    columns = manifest['columns'] + [c for c in rows.columns if c not in manifest['columns']]
+    rows = schema.to_canonical(rows.reindex(columns=columns))
+    version = manifest['version'] + 1
+
+    dates = partition_dates(rows['salesdate'])
+    for date, part in rows.groupby(dates.to_numpy(), sort=True):
+        partition_dir = os.path.join(store_dir, f"salesdate={date}")
+        os.makedirs(partition_dir, exist_ok=True)
+        file_name = f"part-{version:06d}.parquet"
+        table = schema.cast_table(pa.Table.from_pandas(part, preserve_index=False))
+        pq.write_table(table, os.path.join(partition_dir, file_name))
+
+        entry = manifest['partitions'].setdefault(date, {'files': [], 'rows': 0})
+        entry['files'].append(file_name)
+        entry['rows'] += len(part)
+
+    manifest['version'] = version
+    manifest['columns'] = columns
+    _write_manifest(store_dir, manifest)
+    return version
+
+
+def list_partitions(start=None, end=None, store_dir=STORE_DIR):
+    """Partition dates (ISO strings) in the store, pruned to the inclusive [start, end] range."""
+    manifest = read_manifest(store_dir)
+    if manifest is None:
+        return []
+    dates = sorted(manifest['partitions'])
+    if start is not None:
+        dates = [d for d in dates if d >= start]
+    if end is not None:
+        dates = [d for d in dates if d <= end]
+    return dates
+
+
+def _read_file(path, columns):
+    # Files written before the canonical schema are cast on read, so partitions of both kinds concatenate
+    return schema.cast_table(pq.read_table(path, columns=columns))
+
+
+def read_store(start=None, end=None, columns=None, store_dir=STORE_DIR):
+    """Read the store as a DataFrame with the canonical schema types, loading only partitions
+    between start and end (ISO dates). An empty store still has the columns."""
+    manifest = read_manifest(store_dir)
+    if manifest is None:
+        return schema.empty_frame(columns)
+
+    tables = []
+    for date in list_partitions(start, end, store_dir):
+        partition_dir = os.path.join(store_dir, f"salesdate={date}")
+        for file_name in manifest['partitions'][date]['files']:
+            tables.append(_read_file(os.path.join(partition_dir, file_name), columns))
+
+    if not tables:
+        # Also for a new, empty store, whose manifest lists no columns yet
+        return schema.empty_frame(columns or manifest['columns'])
+    df = schema.to_canonical(pa.concat_tables(tables, promote_options="default").to_pandas())
+    return df[columns or [c for c in manifest['columns'] if c in df.columns]]
+
+
+def file_version(file_name):
+    """Store version that wrote a part file (part-000042.parquet was written by version 42)."""
+    return int(file_name[len("part-"):-len(".parquet")])
+
+
+def iter_store_batches(batch_rows=50_000, columns=None, store_dir=STORE_DIR, after_version=None):
+    """Read the whole store in partition (then append) order as DataFrames of at least batch_rows rows.
+
+    Only one batch is held in memory at a time, unlike read_store. With
+    after_version set, only the files appended by later versions are read.
+    """
+    manifest = read_manifest(store_dir)
+    if manifest is None:
+        return
+    columns = columns or manifest['columns']
+    tables, rows = [], 0
+    for date in list_partitions(store_dir=store_dir):
+        partition_dir = os.path.join(store_dir, f"salesdate={date}")
+        for file_name in manifest['partitions'][date]['files']:
+            if after_version is not None and file_version(file_name) <= after_version:
+                continue
+            table = _read_file(os.path.join(partition_dir, file_name), columns)
+            tables.append(table)
+            rows += table.num_rows
+            if rows >= batch_rows:
+                yield schema.to_canonical(pa.concat_tables(tables, promote_options="default").to_pandas())[columns]
+                tables, rows = [], 0
+    if tables:
+        yield schema.to_canonical(pa.concat_tables(tables, promote_options="default").to_pandas())[columns]
+
+
+def migrate_csv(csv_path=CSV_PATH, store_dir=STORE_DIR):
+    """One-time migration of the legacy feature_store.csv into the partitioned store."""
+    if read_manifest(store_dir) is not None:
+        return False
+    os.makedirs(store_dir, exist_ok=True)
+    if os.path.exists(csv_path):
+        existing_data = pd.read_csv(csv_path, dtype=schema.CSV_DTYPES)
+        append_rows(schema.to_canonical(existing_data, table=csv_path), store_dir)
+        logging.info(f"Migrated {len(existing_data)} rows from {csv_path} to {store_dir}")
+    else:
+        _write_manifest(store_dir, {'version': 0, 'columns': [], 'partitions': {}})
+    return True
+
+
+def ensure_store(csv_path=CSV_PATH, store_dir=STORE_DIR):
+    """Make sure the partitioned store exists, migrating the CSV the first time."""
+    if not os.path.exists(os.path.join(store_dir, MANIFEST_NAME)):
+        migrate_csv(csv_path, store_dir)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if migrate_csv():
+        print(f"Feature store migrated to {STORE_DIR}")
+    else:
+        print(f"Feature store already exists at {STORE_DIR}")